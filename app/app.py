@@ -6,35 +6,18 @@ sys.path.append(ROOT_DIR)
 
 
 # ---------- IMPORTS ----------
+import numpy as np
+import pandas as pd
 import streamlit as st
-from src.explain import explain_regime
-from src.data_loader import load_nifty_data
-from src.current_regime import compute_current_regime
-from src.visuals import plot_regime_band
+from src.explain import explain_regime, recommended_strategy, regime_archetype
+from src.data_loader import NIFTY_TICKER
+from src.snapshot import get_snapshot_service, snapshot_age
+from src.instrumentation import METRICS, span, start_metrics_server
+from src.visuals import regime_band_png
 from src.report import generate_weekly_report
 
 
 # ---------- STRATEGY HELPERS ----------
-def recommended_strategy(regime):
-    if regime == 0:
-        return (
-            "Trend-Following Behavior",
-            "Trend-following strategies work best when price movements persist in one direction. "
-            "Moving Average–based approaches historically outperform in such environments."
-        )
-    elif regime == 2:
-        return (
-            "Mean-Reversion Behavior",
-            "In volatile and oscillating markets, prices tend to revert to their mean. "
-            "RSI-style strategies historically perform better in such conditions."
-        )
-    else:
-        return (
-            "Risk-Reduced / Blended Approach",
-            "Mixed regimes are unstable and unpredictable. No single strategy dominates, "
-            "so risk reduction or blended exposure is historically safer."
-        )
-
 def why_not_explanations(regime):
     if regime == 0:
         return {
@@ -52,6 +35,55 @@ def why_not_explanations(regime):
             "Moving Averages": "False breakouts and short-lived trends dominate mixed regimes."
         }
 
+def format_outlook(outlook, names):
+    """
+    Typical duration and next-week state probabilities from the regime history
+    """
+    q25, _, q75 = outlook.duration_quartiles
+
+    if np.isnan(q25):
+        duration = "Not enough history"
+    else:
+        duration = f"{q25 / 5:.1f}-{q75 / 5:.1f} weeks"
+    if not np.isnan(outlook.expected_remaining):
+        duration += f" (about {outlook.expected_remaining:.0f} more trading days expected)"
+
+    if np.isnan(outlook.continue_prob):
+        nxt = "Current run is longer than any seen before"
+    else:
+        parts = [
+            f"{names.get(r, f'Regime {r}')} ({p:.0%})"
+            for r, p in enumerate(outlook.next_state_probs)
+            if r != outlook.regime and not np.isnan(p)
+        ]
+        parts.append(f"Continues ({outlook.continue_prob:.0%})")
+        nxt = " | ".join(parts)
+
+    return duration, nxt
+
+def format_confidence(confidence, margin):
+    """
+    Card value and caption from the latest bar's soft membership and margin
+    """
+    if confidence >= 0.8:
+        level = "High"
+    elif confidence >= 0.6:
+        level = "Moderate"
+    else:
+        level = "Low"
+
+    if np.isinf(margin):
+        note = "Single-regime model"
+    else:
+        note = f"{confidence:.0%} regime membership, {margin:.1f} log-odds over the next closest regime"
+    return f"{level} ({confidence:.0%})", note
+
+@st.cache_resource
+def metrics_server():
+    # Optional scrape endpoint, one per process: REGIME_METRICS_PORT=9108
+    port = os.environ.get("REGIME_METRICS_PORT")
+    return start_metrics_server(int(port)) if port else None
+
 # ---------- PAGE CONFIG ----------
 st.set_page_config(
     page_title="Market Regime Intelligence",
@@ -312,14 +344,6 @@ with st.sidebar:
         help="Select the historical period for regime analysis"
     )
     
-    st.markdown("---")
-    st.markdown("#### 🎯 Display Options")
-    
-    show_timeline = st.checkbox("Show Regime Timeline", value=True)
-    show_strategy = st.checkbox("Show Strategy Guidance", value=True)
-    show_warnings = st.checkbox("Show Strategy Warnings", value=True)
-    show_forecast = st.checkbox("Show Historical Patterns", value=True)
-    
     st.markdown("---")
     st.markdown("#### ℹ️ About")
     st.caption(
@@ -339,16 +363,27 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+metrics_server()
+
 # ---------- LOAD DATA WITH SPINNER ----------
+# Snapshots are shared by every session in this process and refreshed in
+# the background, so reruns and new sessions only read them
 with st.spinner("🔄 Analyzing market data..."):
-    price_data = load_nifty_data(period=data_period)
-    current_regime, feature_data = compute_current_regime(price_data)
+    snapshot = get_snapshot_service().get(NIFTY_TICKER, data_period)
+    current_regime, feature_data = snapshot.current_regime, snapshot.features
 
 # ---------- REGIME MAPPING ----------
+# Names come from the snapshot's model; styling follows the archetype
+# (trending / mixed / mean-reverting) each of its labels stands for
+regime_styles = {
+    0: ("🟢", "#00C853", "#e8f5e9", "#1b5e20"),
+    1: ("🟡", "#FFC107", "#fff9e6", "#f57f17"),
+    2: ("🔴", "#FF1744", "#ffebee", "#b71c1c")
+}
+n_regimes = len(snapshot.regime_names)
 regime_map = {
-    0: ("Trending", "🟢", "#00C853", "#e8f5e9", "#1b5e20"),
-    1: ("Mixed / Transitional", "🟡", "#FFC107", "#fff9e6", "#f57f17"),
-    2: ("Mean-Reverting / Volatile", "🔴", "#FF1744", "#ffebee", "#b71c1c")
+    r: (name, *regime_styles[regime_archetype(r, n_regimes)])
+    for r, name in snapshot.regime_names.items()
 }
 
 regime_name, regime_icon, regime_color, bg_color, border_color = regime_map[current_regime]
@@ -357,7 +392,17 @@ regime_name, regime_icon, regime_color, bg_color, border_color = regime_map[curr
 tab1, tab2, tab3 = st.tabs(["📈 Current Regime", "📊 Analysis & Charts", "📥 Reports"])
 
 # ========== TAB 1: CURRENT REGIME ========== 
-with tab1:
+@st.fragment
+def render_current_regime_tab(current_regime, feature_data, outlook):
+    # Display toggles live inside the fragment so they only rerun this tab
+    t1, t2, t3 = st.columns(3)
+    show_strategy = t1.checkbox("Show Strategy Guidance", value=True)
+    show_warnings = t2.checkbox("Show Strategy Warnings", value=True)
+    show_forecast = t3.checkbox("Show Historical Patterns", value=True)
+
+    regime_name, regime_icon, regime_color, bg_color, border_color = regime_map[current_regime]
+    archetype = regime_archetype(current_regime, n_regimes)
+
     # Top section: Regime Card + AI Explanation
     col1, col2 = st.columns([1, 1.5], gap="large")
     
@@ -376,12 +421,15 @@ with tab1:
         st.markdown("<br>", unsafe_allow_html=True)
         
         # Confidence metric
-        st.markdown("""
+        confidence_label, confidence_note = format_confidence(
+            feature_data["confidence"].iloc[-1], feature_data["margin"].iloc[-1]
+        )
+        st.markdown(f"""
         <div class="metric-container">
             <div class="metric-label">Analysis Confidence</div>
-            <div class="metric-value">High</div>
+            <div class="metric-value">{confidence_label}</div>
             <p style="color: var(--text-secondary); margin-top: 0.5rem; font-size: 0.9rem;">
-                Based on historical pattern matching
+                {confidence_note}
             </p>
         </div>
         """, unsafe_allow_html=True)
@@ -390,7 +438,7 @@ with tab1:
         st.markdown(f"""
         <div class="ai-explanation">
             <h3>🤖 AI Regime Analysis</h3>
-            <p>{explain_regime(current_regime)}</p>
+            <p>{explain_regime(current_regime, k=n_regimes)}</p>
         </div>
         """, unsafe_allow_html=True)
     
@@ -398,7 +446,7 @@ with tab1:
     
     # Strategy Recommendation Section
     if show_strategy:
-        strategy, explanation = recommended_strategy(current_regime)
+        strategy, explanation = recommended_strategy(current_regime, n_regimes)
         
         st.markdown(f"""
         <div class="strategy-card">
@@ -411,7 +459,7 @@ with tab1:
         # Example Indicator
         st.markdown('<div class="section-header"><h2>💡 Optimal Indicator for This Regime</h2></div>', unsafe_allow_html=True)
         
-        if current_regime == 0:
+        if archetype == 0:
             st.markdown("""
             <div class="indicator-card">
                 <h4 style="margin-top: 0; color: #2196F3;">📈 Moving Averages (Trend-Following)</h4>
@@ -425,7 +473,7 @@ with tab1:
             </div>
             """, unsafe_allow_html=True)
         
-        elif current_regime == 2:
+        elif archetype == 2:
             st.markdown("""
             <div class="indicator-card">
                 <h4 style="margin-top: 0; color: #2196F3;">📉 RSI (Mean-Reversion)</h4>
@@ -457,7 +505,7 @@ with tab1:
     if show_warnings:
         st.markdown('<div class="section-header"><h2>⚠️ Strategies to Avoid Right Now</h2></div>', unsafe_allow_html=True)
         
-        reasons = why_not_explanations(current_regime)
+        reasons = why_not_explanations(archetype)
         
         for strat, reason in reasons.items():
             st.markdown(f"""
@@ -469,58 +517,67 @@ with tab1:
     # Historical Pattern Section
     if show_forecast:
         st.markdown('<div class="section-header"><h2>🧠 Historical Pattern Analysis</h2></div>', unsafe_allow_html=True)
+
+        typical_duration, next_state = format_outlook(outlook, snapshot.regime_names)
         
-        if current_regime == 0:
-            st.info("""
+        if archetype == 0:
+            st.info(f"""
             **📊 Trending Regime Behavior**
             
             Historically, trending regimes tend to persist for extended periods (weeks to months),
             but often transition into mixed regimes before fully reversing. Sharp reversals
             directly from trending to mean-reverting states are less common.
             
-            **Typical Duration:** 4-12 weeks  
-            **Next State Probability:** Mixed (60%) | Continues (30%) | Mean-Revert (10%)
+            **Typical Duration:** {typical_duration}  
+            **Next State Probability:** {next_state}
             """)
         
-        elif current_regime == 2:
-            st.info("""
+        elif archetype == 2:
+            st.info(f"""
             **📊 Mean-Reverting Regime Behavior**
             
             Mean-reverting regimes are usually short-lived and characterized by high volatility.
             They often resolve into either strong trending phases (as momentum builds) or
             transition through mixed states before stabilizing.
             
-            **Typical Duration:** 1-4 weeks  
-            **Next State Probability:** Mixed (50%) | Trending (35%) | Continues (15%)
+            **Typical Duration:** {typical_duration}  
+            **Next State Probability:** {next_state}
             """)
         
         else:
-            st.info("""
+            st.info(f"""
             **📊 Mixed Regime Behavior**
             
             Mixed regimes frequently act as transition phases between market states. They're
             characterized by uncertainty and conflicting signals. These periods often precede
             either strong breakout trends or high-volatility mean-reverting phases.
             
-            **Typical Duration:** 2-6 weeks  
-            **Next State Probability:** Trending (45%) | Mean-Revert (40%) | Continues (15%)
+            **Typical Duration:** {typical_duration}  
+            **Next State Probability:** {next_state}
             """)
 
+
 # ========== TAB 2: CHARTS ========== 
-with tab2:
+@st.fragment
+def render_charts_tab(current_regime, feature_data, data_period):
+    regime_name, regime_icon, regime_color, bg_color, border_color = regime_map[current_regime]
+
     st.markdown('<div class="section-header"><h2>📊 Market Regime Timeline</h2></div>', unsafe_allow_html=True)
     
+    show_timeline = st.checkbox("Show Regime Timeline", value=True)
+
     if show_timeline:
         st.markdown('<div class="chart-container">', unsafe_allow_html=True)
         
-        fig = plot_regime_band(feature_data)
-        st.pyplot(fig, use_container_width=True)
+        png = regime_band_png(feature_data, k=n_regimes)
+        with span("render_timeline"):
+            st.image(png, use_container_width=True)
         
         st.markdown('</div>', unsafe_allow_html=True)
         
         st.caption(f"📅 Analysis based on {len(feature_data)} trading days | Period: {data_period}")
     else:
-        st.info("👆 Enable 'Show Regime Timeline' in the sidebar to view the chart")
+        st.info("👆 Enable 'Show Regime Timeline' above to view the chart")
     
     # Additional metrics section
     st.markdown('<div class="section-header"><h2>📈 Key Metrics</h2></div>', unsafe_allow_html=True)
@@ -559,11 +616,18 @@ with tab2:
         </div>
         """, unsafe_allow_html=True)
 
+
+with tab1:
+    render_current_regime_tab(current_regime, feature_data, snapshot.outlook)
+
+with tab2:
+    render_charts_tab(current_regime, feature_data, data_period)
+
 # ========== TAB 3: REPORTS ========== 
 with tab3:
     st.markdown('<div class="section-header"><h2>📥 Weekly Market Report</h2></div>', unsafe_allow_html=True)
     
-    strategy, explanation = recommended_strategy(current_regime)
+    strategy, explanation = recommended_strategy(current_regime, n_regimes)
     
     report_text = generate_weekly_report(
         current_regime,
@@ -601,6 +665,44 @@ with tab3:
     - Historical pattern insights
     """)
 
+# ---------- DIAGNOSTICS ----------
+with st.expander("🩺 Diagnostics", expanded=False):
+    metrics = METRICS.snapshot()
+
+    st.caption(
+        f"Model version: {snapshot.model_version} | "
+        f"Snapshot computed: {snapshot.computed_at:%Y-%m-%d %H:%M:%S} UTC "
+        f"({snapshot_age(snapshot).total_seconds() / 60:.0f} min ago)"
+    )
+
+    snapshots = pd.DataFrame(get_snapshot_service().status())
+    if not snapshots.empty:
+        st.markdown("**Snapshots**")
+        st.dataframe(snapshots, hide_index=True, use_container_width=True)
+        for row in snapshots.dropna(subset=["last_error"]).itertuples():
+            st.warning(f"Refresh of {row.ticker} ({row.period}) is failing: {row.last_error}")
+
+    if metrics["spans"]:
+        stages = pd.DataFrame(metrics["spans"])
+        stages["labels"] = stages["labels"].map(lambda l: ", ".join(f"{k}={v}" for k, v in l.items()))
+        stages["mean_ms"] = stages["sum"] / stages["count"] * 1e3
+        stages["max_ms"] = stages["max"] * 1e3
+        stages["last_ms"] = stages["last"] * 1e3
+        st.markdown("**Stage timings**")
+        st.dataframe(stages[["name", "labels", "count", "mean_ms", "max_ms", "last_ms"]],
+                     hide_index=True, use_container_width=True)
+
+    series = metrics["counters"] + metrics["gauges"]
+    if series:
+        values = pd.DataFrame(series)
+        values["labels"] = values["labels"].map(lambda l: ", ".join(f"{k}={v}" for k, v in l.items()))
+        st.markdown("**Counters and gauges**")
+        st.dataframe(values[["name", "labels", "value"]], hide_index=True, use_container_width=True)
+
+    d1, d2 = st.columns(2)
+    d1.download_button("Export JSON", METRICS.to_json(), file_name="metrics.json", mime="application/json")
+    d2.download_button("Export Prometheus", METRICS.to_prometheus(), file_name="metrics.prom", mime="text/plain")
+
 # ---------- FOOTER ----------
 st.markdown("<br><br>", unsafe_allow_html=True)
 st.markdown("---")
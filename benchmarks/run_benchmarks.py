@@ -0,0 +1,278 @@
+"""
+Benchmark suite for the regime pipeline.
+
+    python benchmarks/run_benchmarks.py --out bench.json
+    python benchmarks/run_benchmarks.py --sizes 1e3 1e5 1e7 --baseline bench.json
+
+Inputs are synthetic regime-switching price series. Each stage is timed
+(best of --repeat runs) and then run once more under tracemalloc for its
+peak allocation. With --baseline, stages slower than baseline * threshold
+are reported and the exit code is 1.
+
+Cold import times of the src modules a pure-compute worker uses are
+measured in fresh interpreters. Any module over --import-budget seconds,
+or one that pulls in matplotlib, yfinance or streamlit, also fails the run.
+So does a universe scan that labels one return path differently at
+different price levels.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT_DIR)
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from src.features import build_features
+from src.regimes import kmeans_numpy
+from src.regime_model import RegimeModel
+from src.current_regime import compute_current_regime
+from src.strategies import rsi_signal_array, ma_signal_array, bb_signal_array
+from src.visuals import plot_regime_band
+from src.report import generate_weekly_report
+from src.universe import scan_universe
+
+DEFAULT_SIZES = [1e3, 1e4, 1e5, 1e6]
+
+# Modules that must stay cheap to import, and what they must not load
+IMPORT_MODULES = ["src", "src.features", "src.regime_model", "src.current_regime", "src.batch_report",
+                  "src.visuals"]
+HEAVY_MODULES = ["matplotlib", "yfinance", "streamlit"]
+DEFAULT_IMPORT_BUDGET = 1.0
+
+# (drift, volatility) per synthetic regime and the chance of staying in it
+REGIMES = [(0.0006, 0.007), (0.0, 0.012), (-0.001, 0.03)]
+STAY_PROB = 0.98
+
+# Price levels one return path is scaled to for the universe scale check
+SCALE_LEVELS = [100, 1000, 20000, 50000]
+
+
+def synthetic_prices(n, seed=0):
+    """
+    OHLCV frame driven by a 3-state Markov chain of (drift, volatility)
+    """
+    rng = np.random.default_rng(seed)
+
+    # Draw regime run lengths geometrically instead of stepping the chain bar by bar
+    lengths = rng.geometric(1 - STAY_PROB, size=n // 10 + 10)
+    states = rng.integers(0, len(REGIMES), size=len(lengths))
+    regimes = np.repeat(states, lengths)[:n]
+
+    drift = np.array([r[0] for r in REGIMES])[regimes]
+    vol = np.array([r[1] for r in REGIMES])[regimes]
+    returns = drift + vol * rng.standard_normal(n)
+    close = 10000 * np.exp(np.cumsum(returns))
+    spread = close * vol * np.abs(rng.standard_normal(n))
+
+    index = pd.date_range("1990-01-01", periods=n, freq="min", name="Date")
+    return pd.DataFrame({
+        "Open": close,
+        "High": close + spread,
+        "Low": close - spread,
+        "Close": close,
+        "Volume": np.full(n, 1e6),
+    }, index=index)
+
+
+def stages(prices):
+    """
+    (name, callable) pairs for one input size; inputs are prepared up front
+    """
+    features = build_features(prices)
+    model = RegimeModel().fit(features)
+    labelled = features.assign(regime=model.predict(features))
+    X = model.transform(features)
+
+    close = prices["Close"]
+    fast = close.rolling(20).mean().to_numpy()
+    slow = close.rolling(50).mean().to_numpy()
+    rsi = np.random.default_rng(1).uniform(0, 100, len(close))
+
+    def plot():
+        fig = plot_regime_band(labelled)
+        fig.canvas.draw()
+        plt.close(fig)
+
+    return [
+        ("build_features", lambda: build_features(prices)),
+        ("kmeans_numpy", lambda: kmeans_numpy(X, k=3)),
+        ("compute_current_regime", lambda: compute_current_regime(prices, model=model)),
+        ("compute_current_regime_refit", lambda: compute_current_regime(prices)),
+        ("rsi_signal_array", lambda: rsi_signal_array(rsi)),
+        ("ma_signal_array", lambda: ma_signal_array(fast, slow)),
+        ("bb_signal_array", lambda: bb_signal_array(close, slow * 0.98, slow * 1.02)),
+        ("plot_regime_band", plot),
+    ]
+
+
+def measure(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return best, peak
+
+
+def import_time(module, repeat):
+    """
+    Best cold import time of `module` over `repeat` fresh interpreters,
+    plus the heavy modules the import loaded
+    """
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(time.perf_counter() - start)\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    best, heavy = float("inf"), []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, capture_output=True, text=True,
+                             check=True).stdout.splitlines()
+        best = min(best, float(out[0]))
+        heavy = [m for m in out[1].split(",") if m] if len(out) > 1 else []
+    return best, heavy
+
+
+def run(sizes, repeat, only=None):
+    results = []
+    if not only or "imports" in only:
+        for module in IMPORT_MODULES:
+            seconds, heavy = import_time(module, repeat)
+            results.append({"name": f"import {module}", "size": 0, "seconds": seconds, "heavy": heavy})
+            loaded = f"  loads {', '.join(heavy)}" if heavy else ""
+            print(f"{'import ' + module:32s} {'':12s}  {seconds * 1e3:10.2f} ms{loaded}", flush=True)
+
+    for size in sizes:
+        n = int(size)
+        prices = synthetic_prices(n)
+        for name, fn in stages(prices):
+            if only and name not in only:
+                continue
+            seconds, peak = measure(fn, repeat)
+            results.append({"name": name, "size": n, "seconds": seconds, "peak_bytes": peak})
+            print(f"{name:32s} n={n:>10,d}  {seconds * 1e3:10.2f} ms  {peak / 2**20:9.1f} MiB", flush=True)
+
+    if not only or "generate_weekly_report" in only:
+        args = (0, "Trending", "Trend-Following Behavior", "explanation")
+        seconds, peak = measure(lambda: generate_weekly_report(*args), repeat)
+        results.append({"name": "generate_weekly_report", "size": 1, "seconds": seconds, "peak_bytes": peak})
+        print(f"{'generate_weekly_report':32s} {'':12s}  {seconds * 1e3:10.2f} ms  {peak / 2**20:9.1f} MiB")
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Entries slower than baseline * threshold, as (name, size, ratio)
+    """
+    reference = {(r["name"], r["size"]): r["seconds"] for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        base = reference.get((r["name"], r["size"]))
+        if base and r["seconds"] > base * threshold:
+            regressions.append((r["name"], r["size"], r["seconds"] / base))
+    return regressions
+
+
+def import_violations(results, budget):
+    """
+    Import entries over budget seconds or loading a heavy module
+    """
+    problems = []
+    for r in results:
+        if not r["name"].startswith("import "):
+            continue
+        if r["seconds"] > budget:
+            problems.append(f"{r['name']} took {r['seconds']:.3f}s (budget {budget:.3f}s)")
+        if r["heavy"]:
+            problems.append(f"{r['name']} loads {', '.join(r['heavy'])}")
+    return problems
+
+
+def scale_violations(n=2000):
+    """
+    Price levels whose universe-scan labels differ from the first level's,
+    for copies of one synthetic series scaled to each of SCALE_LEVELS
+    """
+    prices = synthetic_prices(n)
+    frames = {f"x{level}": prices * (level / prices["Close"].iloc[0]) for level in SCALE_LEVELS}
+    _, labels = scan_universe(frames)
+    return [f"price level {level}: {int((labels[i] != labels[0]).sum())} of {n} labels differ"
+            for i, level in enumerate(SCALE_LEVELS) if (labels[i] != labels[0]).any()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=float, default=DEFAULT_SIZES,
+                        help="bar counts to benchmark (up to 1e7)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+",
+                        help="run only these stages ('imports' and 'scale' for the checks)")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown ratio that counts as a regression")
+    parser.add_argument("--import-budget", type=float, default=DEFAULT_IMPORT_BUDGET,
+                        help="seconds allowed for a cold import of each src module")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeat, args.only)
+    report = {
+        "meta": {
+            "created": pd.Timestamp.now(tz="UTC").isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = False
+    for problem in import_violations(results, args.import_budget):
+        print(f"IMPORT {problem}")
+        failed = True
+
+    if not args.only or "scale" in args.only:
+        for problem in scale_violations():
+            print(f"SCALE {problem}")
+            failed = True
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for name, size, ratio in regressions:
+            print(f"REGRESSION {name} n={size:,d}: {ratio:.2f}x baseline")
+        failed = failed or bool(regressions)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
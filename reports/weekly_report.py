@@ -1,18 +1,16 @@
-from datetime import date
-from src.explain import explain_regime
+from src.explain import regime_names, recommended_strategy
+from src.report import generate_weekly_report as _generate
 
-def generate_weekly_report(current_regime):
-    report = f"""
-    WEEKLY MARKET REGIME REPORT
-    Date: {date.today()}
 
-    Current Regime: {current_regime}
-
-    Interpretation:
-    {explain_regime(current_regime)}
-
-    Note:
-    This report is based on historical regime behavior and is intended
-    for decision support, not price prediction.
+def generate_weekly_report(current_regime, report_date=None, k=3):
+    """
+    Weekly report for a label of a k-regime model; same text as the app's download
     """
-    return report
+    strategy, explanation = recommended_strategy(current_regime, k)
+    return _generate(
+        current_regime,
+        regime_names(k)[current_regime],
+        strategy,
+        explanation,
+        report_date=report_date,
+    )
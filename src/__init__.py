@@ -0,0 +1,59 @@
+"""
+Market regime analysis.
+
+The public names below are resolved on first attribute access, so
+`import src` costs nothing and each submodule (with its own imports) is
+only loaded when something from it is used.
+"""
+import importlib
+
+_EXPORTS = {
+    "load_nifty_data": "src.data_loader",
+    "load_price_data": "src.data_loader",
+    "load_universe_data": "src.data_loader",
+    "NIFTY_TICKER": "src.data_loader",
+    "PriceStore": "src.price_store",
+    "Fetcher": "src.fetch",
+    "set_fetcher": "src.fetch",
+    "build_features": "src.features",
+    "FEATURE_COLUMNS": "src.features",
+    "IncrementalFeatureBuilder": "src.features",
+    "FeatureStore": "src.feature_store",
+    "stream_regimes": "src.streaming",
+    "kmeans_numpy": "src.regimes",
+    "RegimeModel": "src.regime_model",
+    "select_k": "src.model_selection",
+    "choose_k": "src.model_selection",
+    "compute_current_regime": "src.current_regime",
+    "get_regime_model": "src.current_regime",
+    "scan_universe": "src.universe",
+    "run_backtest": "src.backtest",
+    "bootstrap_sharpe": "src.bootstrap",
+    "regime_outlook": "src.transitions",
+    "ChangePointDetector": "src.changepoint",
+    "REGIME_NAMES": "src.explain",
+    "regime_names": "src.explain",
+    "explain_regime": "src.explain",
+    "recommended_strategy": "src.explain",
+    "generate_weekly_report": "src.report",
+    "plot_regime_band": "src.visuals",
+    "regime_band_png": "src.visuals",
+    "ResultCache": "src.result_cache",
+    "get_snapshot_service": "src.snapshot",
+    "METRICS": "src.instrumentation",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
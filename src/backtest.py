@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+STAT_COLUMNS = ["mean", "std", "count", "sharpe", "max_drawdown", "turnover"]
+
+
+def strategy_returns(close, signals):
+    """
+    Next-bar returns of every signal column at once: signal[t-1] * pct_change[t].
+    Returns a (T, S) float64 array; the first row is NaN.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    signals = np.asarray(signals, dtype=np.float64).reshape(len(close), -1)
+
+    returns = np.full(signals.shape, np.nan)
+    pct = close[1:] / close[:-1] - 1
+    returns[1:] = signals[:-1] * pct[:, None]
+    return returns
+
+
+def signal_matrix(signals, regimes=None, policies=None):
+    """
+    (names, (T, S) float64 matrix) of the signal columns followed by one
+    column per policy, each called with the signals plus "regime"
+    """
+    columns = {name: np.asarray(col) for name, col in dict(signals).items()}
+    if policies:
+        context = dict(columns)
+        if regimes is not None:
+            context["regime"] = np.asarray(regimes)
+        for name, policy in policies.items():
+            columns[name] = policy(context)
+
+    names = list(columns)
+    return names, np.column_stack([np.asarray(columns[n], dtype=np.float64) for n in names])
+
+
+def run_backtest(close, regimes, signals, policies=None):
+    """
+    Per-regime mean, std, count, Sharpe, max drawdown and turnover for
+    every strategy in one grouped reduction.
+
+    signals is a DataFrame or dict of signal columns; policies maps extra
+    strategy names to vectorized policies such as adaptive_signal_array,
+    called with the signal columns plus "regime". Pass regimes=None for
+    whole-sample statistics. Returns a DataFrame indexed by (strategy, regime).
+    """
+    names, S = signal_matrix(signals, regimes, policies)
+    R = strategy_returns(close, S)
+
+    if regimes is None:
+        codes = np.zeros(len(R), dtype=np.int64)
+        groups = np.array(["all"])
+    else:
+        groups, codes = np.unique(np.asarray(regimes), return_inverse=True)
+
+    stats = _grouped_stats(R, S, codes, len(groups))
+
+    index = pd.MultiIndex.from_product([names, groups], names=["strategy", "regime"])
+    data = {key: stats[key].T.ravel() for key in STAT_COLUMNS}
+    table = pd.DataFrame(data, index=index)
+    table["count"] = table["count"].astype(np.int64)
+    return table
+
+
+def _grouped_stats(R, S, codes, n_groups):
+    # Sort rows by regime once; stable so each group stays in time order
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.searchsorted(sorted_codes, np.arange(n_groups))
+
+    Rs = R[order]
+    valid = ~np.isnan(Rs)
+    Rz = np.where(valid, Rs, 0.0)
+
+    count = np.add.reduceat(valid, starts, axis=0).astype(np.float64)
+    total = np.add.reduceat(Rz, starts, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+        dev = np.where(valid, Rs - mean[sorted_codes], 0.0)
+        std = np.sqrt(np.add.reduceat(dev * dev, starts, axis=0) / (count - 1))
+        sharpe = mean / std
+
+    # Drawdown of the compounded regime-conditional equity curve. A per-group
+    # offset makes one running max reset at every group boundary.
+    log_eq = np.log1p(Rz)
+    cum = np.cumsum(log_eq, axis=0)
+    base = np.vstack([np.zeros((1, R.shape[1])), cum])[starts][sorted_codes]
+    cum = cum - base
+    span = 2.0 * np.abs(cum).max() + 1.0
+    offset = (sorted_codes * span)[:, None]
+    peak = np.maximum(np.maximum.accumulate(cum + offset, axis=0), offset) - offset
+    drawdown = np.expm1(cum - peak)
+    max_dd = np.minimum.reduceat(drawdown, starts, axis=0)
+
+    # Turnover: mean absolute position change on each regime's bars
+    change = np.abs(np.diff(S, axis=0, prepend=S[:1]))[order]
+    change = np.where(np.isnan(change), 0.0, change)
+    turnover = np.add.reduceat(change, starts, axis=0) / np.bincount(codes, minlength=n_groups)[:, None]
+
+    return {
+        "mean": mean,
+        "std": std,
+        "count": count,
+        "sharpe": sharpe,
+        "max_drawdown": max_dd,
+        "turnover": turnover,
+    }
@@ -0,0 +1,280 @@
+"""
+Headless weekly reports for many tickers and as-of dates.
+
+    python -m src.batch_report ^NSEI ^NSEBANK --start 2024-01-01 --freq W-MON --out out/reports
+    python -m src.batch_report --tickers-file tickers.txt --format jsonl --workers 8
+
+Prices are loaded once per ticker and the persisted regime model is shared
+by every worker. Its range_20 feature is in price units, so tickers whose
+price range is far from the model's are skipped with a warning. Each
+worker builds one ticker's features and labels once, then reads the
+regime at every as-of date off them (features only look back, so the
+label on the last bar at or before a date is what the app would have
+shown that day). Features and labels go through the shared ResultCache
+unless --no-cache is given, so a rerun over the same prices (or the app's
+own runs) reuses them. Reports are written in one pass at the end, with a
+summary.csv alongside. Matplotlib is only imported with --charts.
+"""
+import argparse
+import json
+import math
+import multiprocessing as mp
+import os
+import re
+import sys
+import pandas as pd
+from src.data_loader import load_universe_data, period_start, NIFTY_TICKER
+from src.current_regime import get_regime_model
+from src.features import build_features, FEATURE_COLUMNS
+from src.explain import regime_names, recommended_strategy
+from src.report import generate_weekly_report
+from src.result_cache import ResultCache, cached_build_features, cached_assign
+
+# Feature window behind each report and its chart, as in the app
+DEFAULT_LOOKBACK = "6mo"
+
+# range_20 is in price units, so tickers whose typical range is this many
+# times the model's (or this many times smaller) are not reported on
+MAX_RANGE_RATIO = 4.0
+
+# Set in each worker process by _init_worker
+_MODEL = None
+_CACHE = None
+
+
+def as_of_dates(dates=None, start=None, end=None, freq="W-MON"):
+    """
+    Explicit dates, or a start/end range at `freq`; defaults to today
+    """
+    if dates:
+        return sorted(pd.Timestamp(d).normalize() for d in dates)
+    if start:
+        end = pd.Timestamp(end) if end else pd.Timestamp.today()
+        return list(pd.date_range(pd.Timestamp(start), end.normalize(), freq=freq))
+    return [pd.Timestamp.today().normalize()]
+
+
+def history_period(dates, lookback=DEFAULT_LOOKBACK, now=None):
+    """
+    Shortest yfinance period (in whole years) that covers the lookback
+    window of the earliest as-of date
+    """
+    now = now or pd.Timestamp.today()
+    first = period_start(min(dates), lookback)
+    return f"{math.ceil((now - first).days / 365.25) + 1}y"
+
+
+def range_ratio(prices, model):
+    """
+    Median 20-bar High-Low range of `prices` over the mean range_20 the
+    model was fitted on (1.0 if the model has no range feature)
+    """
+    if "range_20" not in model.feature_names_:
+        return 1.0
+    fitted = model.mean_[model.feature_names_.index("range_20")]
+    return float((prices["High"] - prices["Low"]).rolling(20).mean().median() / fitted)
+
+
+def generate_reports(price_frames, dates, model, n_workers=None, charts_dir=None,
+                     lookback=DEFAULT_LOOKBACK, cache=None):
+    """
+    Reports for every (ticker, as-of date).
+
+    Returns a list of dicts with the summary fields plus the report "text";
+    dates before a ticker's first complete feature row are skipped. A
+    ResultCache, if given, is consulted for features and assignments.
+    """
+    tasks = [(ticker, prices, dates, charts_dir, lookback) for ticker, prices in price_frames.items()]
+    n_workers = min(n_workers or os.cpu_count() or 1, len(tasks)) or 1
+
+    if n_workers == 1:
+        _init_worker(model, cache)
+        batches = map(_ticker_reports, tasks)
+        return [row for rows in batches for row in rows]
+
+    results = []
+    with mp.Pool(n_workers, initializer=_init_worker, initargs=(model, cache)) as pool:
+        for rows in pool.imap_unordered(_ticker_reports, tasks):
+            results.extend(rows)
+    return results
+
+
+def write_reports(results, out_dir, fmt="txt"):
+    """
+    Write report texts (one file per report, or a single reports.jsonl)
+    and summary.csv under out_dir
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    results = sorted(results, key=lambda r: (r["ticker"], r["as_of"]))
+
+    if fmt == "jsonl":
+        with open(os.path.join(out_dir, "reports.jsonl"), "w", encoding="utf-8") as f:
+            for row in results:
+                f.write(json.dumps(row, default=str, ensure_ascii=False) + "\n")
+    else:
+        for row in results:
+            path = os.path.join(out_dir, row["file"])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(row["text"])
+
+    summary = pd.DataFrame([{k: v for k, v in row.items() if k != "text"} for row in results])
+    summary.to_csv(os.path.join(out_dir, "summary.csv"), index=False)
+    return summary
+
+
+def _init_worker(model, cache=None):
+    global _MODEL, _CACHE
+    _MODEL, _CACHE = model, cache
+
+
+def _ticker_reports(task):
+    ticker, prices, dates, charts_dir, lookback = task
+    features = cached_build_features(prices, _CACHE) if _CACHE is not None else build_features(prices)
+    if features.empty:
+        return []
+    if _CACHE is not None:
+        assignment = cached_assign(features, _MODEL, _CACHE)
+    else:
+        assignment = _MODEL.assign(features)
+    features["regime"] = assignment.labels
+    features["confidence"] = assignment.membership.max(axis=1)
+
+    index = features.index
+    names = regime_names(_MODEL.k)
+    rows = []
+    for as_of in dates:
+        # Last bar on or before the as-of date
+        pos = index.searchsorted(_align(as_of + pd.Timedelta(days=1), index.tz), side="left") - 1
+        if pos < 0:
+            continue
+
+        bar = features.iloc[pos]
+        regime = int(bar["regime"])
+        strategy, explanation = recommended_strategy(regime, _MODEL.k)
+        name = names[regime]
+        stem = f"{_safe_name(ticker)}/{as_of:%Y-%m-%d}"
+
+        row = {
+            "ticker": ticker,
+            "as_of": as_of.date(),
+            "bar_date": index[pos].date(),
+            "regime": regime,
+            "regime_name": name,
+            "strategy": strategy,
+            "confidence": float(bar["confidence"]),
+            **{c: float(bar[c]) for c in FEATURE_COLUMNS},
+            "model_version": _MODEL.version,
+            "file": f"{stem}.txt",
+            "text": generate_weekly_report(regime, name, strategy, explanation, report_date=as_of),
+        }
+
+        if charts_dir:
+            start = _align(period_start(as_of, lookback), index.tz)
+            window = features.iloc[:pos + 1]
+            row["chart"] = _save_chart(window[window.index >= start], os.path.join(charts_dir, f"{stem}.png"),
+                                       _MODEL.k)
+
+        rows.append(row)
+    return rows
+
+
+def _save_chart(feature_data, path, k):
+    # Imported here so report-only runs never load matplotlib
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from src.visuals import plot_regime_band
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fig = plot_regime_band(feature_data, k=k)
+    fig.savefig(path, bbox_inches="tight")
+    plt.close(fig)
+    return path
+
+
+def _align(ts, tz):
+    if tz is None:
+        return ts.tz_localize(None) if ts.tz is not None else ts
+    return ts.tz_localize(tz) if ts.tz is None else ts.tz_convert(tz)
+
+
+def _safe_name(ticker):
+    return re.sub(r"[^\w.-]", "_", ticker)
+
+
+def _read_tickers(path):
+    with open(path) as f:
+        lines = (line.split("#", 1)[0].strip() for line in f)
+        return [line for line in lines if line]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("tickers", nargs="*", help=f"tickers to report on (default {NIFTY_TICKER})")
+    parser.add_argument("--tickers-file", help="file with one ticker per line (# comments allowed)")
+    parser.add_argument("--dates", nargs="+", help="explicit as-of dates")
+    parser.add_argument("--start", help="first as-of date of a range")
+    parser.add_argument("--end", help="last as-of date of a range (default today)")
+    parser.add_argument("--freq", default="W-MON", help="as-of date frequency for --start/--end")
+    parser.add_argument("--lookback", default=DEFAULT_LOOKBACK, help="window shown in charts")
+    parser.add_argument("--history", help="price history to load (default: enough for the earliest date)")
+    parser.add_argument("--model", help="saved RegimeModel (.npz; default: the app's daily model, fitted on first use)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--out", default="reports_out", help="output directory")
+    parser.add_argument("--format", choices=["txt", "jsonl"], default="txt")
+    parser.add_argument("--charts", action="store_true", help="also render a regime timeline PNG per report")
+    parser.add_argument("--offline", action="store_true", help="use stored prices only")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the result cache")
+    args = parser.parse_args(argv)
+
+    tickers = list(args.tickers)
+    if args.tickers_file:
+        tickers += _read_tickers(args.tickers_file)
+    tickers = list(dict.fromkeys(tickers or [NIFTY_TICKER]))
+
+    dates = as_of_dates(args.dates, args.start, args.end, args.freq)
+    if not dates:
+        parser.error("no as-of dates in the requested range")
+
+    if args.model:
+        if not os.path.exists(args.model):
+            parser.error(f"model file not found: {args.model}")
+        from src.regime_model import RegimeModel
+        model = RegimeModel.load(args.model)
+    else:
+        model = get_regime_model()
+
+    history = args.history or history_period(dates, args.lookback)
+    # Tickers that cannot be loaded come back as empty frames
+    prices = load_universe_data(tickers, period=history, refresh=not args.offline)
+
+    skipped = []
+    for ticker, df in prices.items():
+        if df.empty:
+            print(f"skipping {ticker}: no price data", file=sys.stderr)
+            skipped.append(ticker)
+            continue
+        ratio = range_ratio(df, model)
+        if not 1 / MAX_RANGE_RATIO <= ratio <= MAX_RANGE_RATIO:
+            print(f"skipping {ticker}: its price range is {ratio:.3g}x the model's; fit a model for it "
+                  f"with `python -m src.model_selection {ticker} --save <path>` and pass --model",
+                  file=sys.stderr)
+            skipped.append(ticker)
+    prices = {t: df for t, df in prices.items() if t not in skipped}
+    if not prices:
+        print("no ticker left to report on", file=sys.stderr)
+        return 1
+
+    charts_dir = os.path.join(args.out, "charts") if args.charts else None
+    results = generate_reports(prices, dates, model, n_workers=args.workers, charts_dir=charts_dir,
+                               lookback=args.lookback, cache=None if args.no_cache else ResultCache())
+    summary = write_reports(results, args.out, args.format)
+
+    print(f"{len(summary)} reports for {len(prices)} tickers x {len(dates)} dates -> {args.out}"
+          + (f" ({len(skipped)} skipped: {', '.join(skipped)})" if skipped else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""
+Online regime change-point alerts.
+
+    python -m src.changepoint --csv nifty_1m.csv --model models/regime_model_1m.npz --jsonl alerts.jsonl
+    python -m src.changepoint --ticker ^NSEI --interval 5m --period 59d --socket 127.0.0.1:9109
+
+Each bar is turned into a feature row by IncrementalFeatureBuilder and
+scored against the fitted centroids of a RegimeModel. No clustering is
+re-run. Under the model's equal-weight Gaussian mixture (see
+regimes.assign_soft), the log-likelihood of regime j is
+-d2_j / (2 sigma2). A CUSUM per alternative regime accumulates the
+log-likelihood ratio over the regime currently in force:
+
+    S_j = max(0, S_j + (d2_current - d2_j) / (2 sigma2) - drift)
+
+When some S_j passes `threshold`, regime j takes over, every S is reset
+and a ChangeAlert goes to the sinks. Work and memory per bar are O(k * d),
+independent of how many bars have been seen.
+"""
+import argparse
+import json
+import math
+import os
+import socket
+import sys
+import time
+from collections import namedtuple
+from src.features import IncrementalFeatureBuilder
+from src.instrumentation import incr, METRICS
+
+# CUSUM alarm level, in nats of accumulated log-likelihood ratio
+DEFAULT_THRESHOLD = 5.0
+
+ChangeAlert = namedtuple(
+    "ChangeAlert",
+    ["timestamp", "previous", "regime", "statistic", "membership", "run_length", "latency_us"],
+)
+
+
+class ChangePointDetector:
+    """
+    CUSUM change-point detector over a fitted RegimeModel.
+
+    update() takes one OHLC bar and update_features() one feature row
+    (values in model.feature_names_ order). Both return a ChangeAlert
+    when the regime in force changes and None otherwise. The first
+    complete row sets the starting regime without an alert. An alert's
+    latency_us runs from the bar's arrival to the decision; `latency`
+    collects the same per bar, including delivery to the sinks.
+    """
+
+    def __init__(self, model, sinks=(), threshold=DEFAULT_THRESHOLD, drift=0.0,
+                 vol_window=20, trend_window=50, range_window=20):
+        if model.centroids_ is None:
+            raise RuntimeError("RegimeModel is not fitted yet")
+        self.threshold = threshold
+        self.drift = drift
+        self.sinks = [s if hasattr(s, "emit") else CallbackSink(s) for s in sinks]
+        self.builder = IncrementalFeatureBuilder(vol_window, trend_window, range_window)
+        self.latency = LatencyStats()
+
+        # Plain floats: at k * d of a few each, Python arithmetic beats numpy call overhead
+        self.feature_names = list(model.feature_names_)
+        self._mean = [float(v) for v in model.mean_]
+        self._inv_scale = [1.0 / float(v) for v in model.scale_]
+        self._centroids = [[float(v) for v in c] for c in model.centroids_]
+        self._scale = 1.0 / (2.0 * model.sigma2_)
+        self.k = len(self._centroids)
+
+        self.regime = None
+        self.run_length = 0
+        self._stats = [0.0] * self.k
+        self._d2 = None
+
+    def update(self, timestamp, high, low, close):
+        """
+        Feed one bar
+        """
+        start = time.perf_counter_ns()
+        row = self.builder.update(timestamp, high, low, close)
+        if row is None:
+            return None
+        return self._step(timestamp, [getattr(row, name) for name in self.feature_names], start)
+
+    def update_features(self, timestamp, values):
+        """
+        Feed one feature row, e.g. a row of build_features output
+        """
+        return self._step(timestamp, values, time.perf_counter_ns())
+
+    def run(self, df):
+        """
+        Feed a block of OHLC bars in order; returns the alerts raised
+        """
+        alerts = []
+        for ts, high, low, close in zip(df.index, df["High"].to_numpy(),
+                                        df["Low"].to_numpy(), df["Close"].to_numpy()):
+            alert = self.update(ts, high, low, close)
+            if alert is not None:
+                alerts.append(alert)
+        return alerts
+
+    @property
+    def membership(self):
+        """
+        Soft membership of the last row, as RegimeModel.assign would give it
+        """
+        if self._d2 is None:
+            return None
+        nearest = min(self._d2)
+        weights = [math.exp((nearest - d) * self._scale) for d in self._d2]
+        total = sum(weights)
+        return [w / total for w in weights]
+
+    @property
+    def statistics(self):
+        """
+        Current CUSUM statistic for each regime (0 for the one in force)
+        """
+        return list(self._stats)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def _step(self, timestamp, values, start):
+        z = [(float(v) - m) * s for v, m, s in zip(values, self._mean, self._inv_scale)]
+        d2 = []
+        for c in self._centroids:
+            acc = 0.0
+            for a, b in zip(z, c):
+                acc += (a - b) * (a - b)
+            d2.append(acc)
+        self._d2 = d2
+
+        if self.regime is None:
+            self.regime = d2.index(min(d2))
+            self.run_length = 1
+            self.latency.add(time.perf_counter_ns() - start)
+            return None
+
+        current = d2[self.regime]
+        stats = self._stats
+        best = self.regime
+        for j in range(self.k):
+            if j != self.regime:
+                s = stats[j] + (current - d2[j]) * self._scale - self.drift
+                stats[j] = s if s > 0.0 else 0.0
+                if stats[j] > stats[best]:
+                    best = j
+
+        if best == self.regime or stats[best] < self.threshold:
+            self.run_length += 1
+            self.latency.add(time.perf_counter_ns() - start)
+            return None
+
+        alert = ChangeAlert(timestamp, self.regime, best, stats[best], tuple(self.membership),
+                            self.run_length, (time.perf_counter_ns() - start) / 1e3)
+        self.regime, self.run_length = best, 1
+        self._stats = [0.0] * self.k
+        for sink in self.sinks:
+            sink.emit(alert)
+
+        elapsed = time.perf_counter_ns() - start
+        self.latency.add(elapsed)
+        incr("changepoint_alerts", regime=best)
+        METRICS.observe("changepoint_alert_latency", elapsed / 1e9)
+        return alert
+
+
+class LatencyStats:
+    """
+    Count, mean, max and approximate quantiles of nanosecond durations in
+    constant memory. Each power of two is split into four histogram
+    buckets, so quantiles are within 25% of the true value.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = [0] * 256
+
+    def add(self, ns):
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+        self.buckets[_bucket(ns)] += 1
+
+    def quantile(self, q):
+        """
+        Upper bound (ns) of the bucket holding the q-quantile
+        """
+        if not self.count:
+            return math.nan
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(_bucket_end(i), self.max)
+        return self.max
+
+    def summary(self):
+        """
+        Microsecond summary for display or export
+        """
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_us": self.total / self.count / 1e3,
+            "p50_us": self.quantile(0.5) / 1e3,
+            "p99_us": self.quantile(0.99) / 1e3,
+            "max_us": self.max / 1e3,
+        }
+
+
+class CallbackSink:
+    """
+    Calls fn(alert) for every alert
+    """
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def emit(self, alert):
+        self.fn(alert)
+
+    def close(self):
+        pass
+
+
+class FileSink:
+    """
+    Appends one JSON object per alert to a file, flushed on every write
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def emit(self, alert):
+        self._file.write(alert_json(alert) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class SocketSink:
+    """
+    Sends each alert as one JSON datagram to "host:port" (UDP) or to a
+    Unix datagram socket path. Sends never block; undeliverable alerts
+    are counted and dropped.
+    """
+
+    def __init__(self, address):
+        if ":" in address and not address.startswith("/"):
+            host, port = address.rsplit(":", 1)
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.address = (host, int(port))
+        else:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.address = address
+        self._sock.setblocking(False)
+
+    def emit(self, alert):
+        try:
+            self._sock.sendto(alert_json(alert).encode(), self.address)
+        except OSError:
+            incr("changepoint_alerts_dropped")
+
+    def close(self):
+        self._sock.close()
+
+
+def _bucket(ns):
+    # Octave from the bit length, quarter from the two bits after the leading one
+    bits = ns.bit_length()
+    if bits < 3:
+        return ns
+    return min(bits * 4 - 8 + ((ns >> (bits - 3)) & 3), 255)
+
+
+def _bucket_end(i):
+    # Largest duration that falls in bucket i
+    if i < 4:
+        return i
+    bits, quarter = divmod(i + 8, 4)
+    return ((5 + quarter) << (bits - 3)) - 1
+
+
+def alert_json(alert):
+    """
+    One-line JSON form of a ChangeAlert
+    """
+    return json.dumps({**alert._asdict(), "membership": [round(p, 6) for p in alert.membership]},
+                      default=str)
+
+
+def _bars(args):
+    if args.csv:
+        from src.streaming import csv_chunks
+        for chunk in csv_chunks(args.csv):
+            yield chunk
+    else:
+        from src.data_loader import load_price_data
+        yield load_price_data(args.ticker, period=args.period, interval=args.interval,
+                              refresh=not args.offline)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv", help="bar CSV to replay")
+    source.add_argument("--ticker", help="ticker to replay from the price store")
+    parser.add_argument("--interval", default="1d")
+    parser.add_argument("--period", default="1y", help="history to replay with --ticker")
+    parser.add_argument("--offline", action="store_true", help="use stored prices only")
+    parser.add_argument("--model", help="saved RegimeModel (default: the app's daily model, fitted on first use)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--drift", type=float, default=0.0)
+    parser.add_argument("--jsonl", help="append alerts to this file")
+    parser.add_argument("--socket", help="send alerts to host:port (UDP) or a Unix socket path")
+    args = parser.parse_args(argv)
+
+    if args.model:
+        if not os.path.exists(args.model):
+            parser.error(f"model file not found: {args.model}")
+        from src.regime_model import RegimeModel
+        model = RegimeModel.load(args.model)
+    else:
+        from src.current_regime import get_regime_model
+        model = get_regime_model()
+
+    sinks = [CallbackSink(lambda alert: print(alert_json(alert)))]
+    if args.jsonl:
+        sinks.append(FileSink(args.jsonl))
+    if args.socket:
+        sinks.append(SocketSink(args.socket))
+
+    detector = ChangePointDetector(model, sinks, threshold=args.threshold, drift=args.drift)
+    try:
+        for bars in _bars(args):
+            detector.run(bars)
+    finally:
+        detector.close()
+
+    print(f"{detector.builder.n_bars:,d} bars, latency {detector.latency.summary()}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
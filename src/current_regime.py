@@ -1,20 +1,78 @@
-import numpy as np
+import os
 from src.features import build_features
-from src.regimes import kmeans_numpy
+from src.regime_model import RegimeModel
+from src.data_loader import load_nifty_data
+from src.result_cache import cached_build_features, cached_assign
+from src.instrumentation import timed
 
-def compute_current_regime(price_df, k=3):
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_MODEL_PATH = os.path.join(ROOT_DIR, "models", "regime_model.npz")
+
+# History used to fit the default model when none has been saved yet
+DEFAULT_FIT_PERIOD = "10y"
+
+
+@timed("compute_current_regime")
+def compute_current_regime(price_df, k=3, model=None, cache=None):
     """
-    Compute current market regime from recent data
+    Compute current market regime from recent data.
+
+    With a fitted `model` the window is only assigned to its stored
+    centroids; without one a model is fitted on the window itself, with
+    k chosen by model_selection when k="auto".
+    Alongside "regime", "confidence" is the soft membership of the
+    assigned regime and "margin" its log-likelihood ratio over the
+    runner-up. A ResultCache, if given, is consulted for features and
+    assignments.
     """
-    features = build_features(price_df)
+    if cache is not None:
+        features = cached_build_features(price_df, cache)
+    else:
+        features = build_features(price_df)
 
-    X = features.values
-    labels = kmeans_numpy(X, k=k)
+    if model is None:
+        model = RegimeModel(k=_resolve_k(features, k)).fit(features)
 
-    # Attach regime labels
-    features["regime"] = labels
+    # Attach regime labels, the membership of the assigned regime and the
+    # margin over the runner-up, all from one pass
+    if cache is not None:
+        assignment = cached_assign(features, model, cache)
+    else:
+        assignment = model.assign(features)
+    features["regime"] = assignment.labels
+    features["confidence"] = assignment.membership.max(axis=1)
+    features["margin"] = assignment.margin
 
     # Most recent regime
     current_regime = int(features["regime"].iloc[-1])
 
     return current_regime, features
+
+
+def fit_regime_model(price_df, k=3):
+    """
+    Fit a RegimeModel on the features of a (long) price history;
+    k="auto" selects k with model_selection first
+    """
+    features = build_features(price_df)
+    return RegimeModel(k=_resolve_k(features, k)).fit(features)
+
+
+def get_regime_model(path=DEFAULT_MODEL_PATH, k=3, period=DEFAULT_FIT_PERIOD):
+    """
+    Load the persisted regime model, fitting and saving it on first use
+    """
+    if os.path.exists(path):
+        return RegimeModel.load(path)
+
+    model = fit_regime_model(load_nifty_data(period=period), k=k)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    model.save(path)
+    return model
+
+
+def _resolve_k(features, k):
+    if k != "auto":
+        return k
+    from src.model_selection import auto_k
+    return auto_k(features)
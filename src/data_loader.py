@@ -1,11 +1,184 @@
-import yfinance as yf
+import logging
+import os
+from collections import namedtuple
 import pandas as pd
+from src.price_store import PriceStore, FULL_HISTORY, DEFAULT_SEED_CSV, OHLCV_COLUMNS, _align_tz
+from src.fetch import fetch_all, FetchRequest
+from src.instrumentation import incr
 
-def load_nifty_data(period="6mo"):
+NIFTY_TICKER = "^NSEI"
+
+logger = logging.getLogger(__name__)
+
+# How long stored bars are trusted before asking the provider for new ones
+REFRESH_AFTER = pd.Timedelta("1h")
+
+# How far back the provider serves each intraday interval (a little inside
+# its limits); older intraday bars are only available from the store
+INTRADAY_HISTORY = {
+    "1m": pd.Timedelta(days=7),
+    "2m": pd.Timedelta(days=59),
+    "5m": pd.Timedelta(days=59),
+    "15m": pd.Timedelta(days=59),
+    "30m": pd.Timedelta(days=59),
+    "60m": pd.Timedelta(days=729),
+    "90m": pd.Timedelta(days=59),
+    "1h": pd.Timedelta(days=729),
+}
+
+# What one load needs from the provider: kind is "hit", "delta" or "full_download"
+_Plan = namedtuple("_Plan", ["ticker", "interval", "stored", "start", "full_history", "kind", "request"])
+
+
+
+class NoPriceDataError(RuntimeError):
+    """
+    Nothing is stored for a ticker and the provider returned no bars
+    """
+
+
+_PERIOD_OFFSETS = {
+    "d": lambda n: pd.DateOffset(days=n),
+    "wk": lambda n: pd.DateOffset(weeks=n),
+    "mo": lambda n: pd.DateOffset(months=n),
+    "y": lambda n: pd.DateOffset(years=n),
+}
+
+
+def load_nifty_data(period="6mo", interval="1d", store=None, refresh=True):
     """
     Load recent NIFTY 50 data
     """
-    df = yf.download("^NSEI", period=period, interval="1d")
-    df = df[["Open", "High", "Low", "Close", "Volume"]]
-    df.dropna(inplace=True)
-    return df
+    return load_price_data(NIFTY_TICKER, period=period, interval=interval,
+                           store=store, refresh=refresh)
+
+
+def load_price_data(ticker, period="6mo", interval="1d", store=None, refresh=True):
+    """
+    Load OHLCV bars for a ticker through the local price store.
+
+    Stored bars are read first and only the bars after the last stored
+    timestamp are requested from the provider. If the provider cannot be
+    reached the stored bars are returned as they are (NoPriceDataError if
+    there are none). Intraday intervals
+    are only requested as far back as the provider serves them; the store
+    keeps everything fetched so far, so history builds up across runs.
+    """
+    store = store or PriceStore()
+    plan = _plan(ticker, period, interval, store, refresh)
+    fresh = fetch_all([plan.request])[0] if plan.request is not None else None
+    return _apply(plan, fresh, store)
+
+
+def load_universe_data(tickers, period="6mo", interval="1d", store=None, refresh=True):
+    """
+    Load OHLCV bars for many tickers; returns {ticker: DataFrame}.
+
+    Every provider request is issued concurrently through the fetch layer,
+    so the wall time is about that of the slowest few requests. A ticker
+    that cannot be loaded (delisted, misspelled, provider unreachable
+    with nothing stored) maps to an empty frame and is logged, so callers
+    can skip it instead of losing the whole universe.
+    """
+    store = store or PriceStore()
+    plans = [_plan(ticker, period, interval, store, refresh) for ticker in dict.fromkeys(tickers)]
+    requests = [plan.request for plan in plans if plan.request is not None]
+    fetched = dict(zip(requests, fetch_all(requests)))
+
+    frames = {}
+    for plan in plans:
+        try:
+            frames[plan.ticker] = _apply(plan, fetched.get(plan.request), store)
+        except (NoPriceDataError, ValueError) as exc:
+            frames[plan.ticker] = _empty_frame()
+            incr("universe_load_errors", interval=interval)
+            logger.warning("No price data for %s: %s", plan.ticker, exc)
+    return frames
+
+
+def period_start(now, period):
+    """
+    Translate a yfinance period string ("6mo", "2y", "max", ...) into a start timestamp
+    """
+    if period == "max":
+        return None
+    if period == "ytd":
+        return pd.Timestamp(year=now.year, month=1, day=1, tz=now.tz)
+
+    for suffix, offset in _PERIOD_OFFSETS.items():
+        if period.endswith(suffix) and period[:-len(suffix)].isdigit():
+            return (now - offset(int(period[:-len(suffix)]))).normalize()
+
+    raise ValueError(f"Unsupported period: {period}")
+
+
+def _plan(ticker, period, interval, store, refresh):
+    seedable = ticker == NIFTY_TICKER and interval == "1d" and os.path.exists(DEFAULT_SEED_CSV)
+    if seedable and not store.exists(ticker, interval):
+        store.seed_from_csv(DEFAULT_SEED_CSV, ticker=ticker, interval=interval)
+
+    stored = store.read(ticker, interval)
+    info = store.info(ticker, interval)
+    # One clock whether or not anything is stored yet, so the period start
+    # does not move between the first load and later ones
+    now = pd.Timestamp.now(tz="UTC")
+    start = period_start(now, period)
+
+    # The part of the period the provider can still serve
+    reachable, download_period = start, period
+    limit = INTRADAY_HISTORY.get(interval)
+    if limit is not None and (start is None or start < now - limit):
+        reachable, download_period = now - limit, f"{limit.days}d"
+
+    request, kind = None, "hit"
+    if stored is None or not _covers(info["covered_from"], reachable):
+        kind = "full_download"
+        request = FetchRequest(ticker, interval, period=download_period)
+    elif refresh and now - info["fetched_at"] > REFRESH_AFTER:
+        kind = "delta"
+        # Re-request the last stored bar as well, it may have been a partial one
+        delta_start = stored.index[-1]
+        if limit is not None and delta_start < _align_tz(now - limit, stored.index.tz):
+            # The provider no longer serves the bars in between
+            delta_start = _align_tz(now - limit, stored.index.tz)
+            incr("price_store_gaps", interval=interval)
+            logger.warning("%s %s: bars from %s to %s are past the provider's %s limit and will be "
+                           "missing from the store", ticker, interval, stored.index[-1], delta_start,
+                           f"{limit.days}d")
+        request = FetchRequest(ticker, interval, start=delta_start)
+    incr("price_store_requests", result=kind)
+
+    return _Plan(ticker, interval, stored, start, reachable is None, kind, request)
+
+
+def _apply(plan, fresh, store):
+    stored = plan.stored
+    if plan.kind == "full_download" and fresh is not None:
+        stored = store.append(plan.ticker, fresh, plan.interval,
+                              covered_from=FULL_HISTORY if plan.full_history else fresh.index[0])
+    elif plan.kind == "delta":
+        if fresh is not None:
+            stored = store.append(plan.ticker, fresh, plan.interval)
+        else:
+            store.touch(plan.ticker, plan.interval)
+
+    if stored is None:
+        raise NoPriceDataError(f"No data available for {plan.ticker} ({plan.interval}) and the provider is unreachable")
+
+    if plan.start is not None:
+        stored = stored[stored.index >= _align_tz(plan.start, stored.index.tz)]
+    return stored
+
+
+def _empty_frame():
+    return pd.DataFrame({c: pd.Series(dtype="float64") for c in OHLCV_COLUMNS},
+                        index=pd.DatetimeIndex([], name="Date"))
+
+
+def _covers(covered_from, start):
+    if covered_from == FULL_HISTORY:
+        return True
+    if start is None:
+        return False
+    # Allow for a non-trading first day of the requested period
+    return covered_from <= _align_tz(start, covered_from.tz) + pd.Timedelta(days=7)
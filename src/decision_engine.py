@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def adaptive_signal(row):
     if row["regime"] == 0:
         return row["ma_signal"]
@@ -5,3 +8,15 @@ def adaptive_signal(row):
         return row["rsi_signal"]
     else:
         return (row["ma_signal"] + row["rsi_signal"] + row["bb_signal"]) / 3
+
+
+def adaptive_signal_array(columns):
+    """
+    Vectorized adaptive_signal over whole columns (DataFrame or dict of arrays)
+    """
+    regime = np.asarray(columns["regime"])
+    ma = np.asarray(columns["ma_signal"], dtype=np.float64)
+    rsi = np.asarray(columns["rsi_signal"], dtype=np.float64)
+    bb = np.asarray(columns["bb_signal"], dtype=np.float64)
+
+    return np.select([regime == 0, regime == 2], [ma, rsi], default=(ma + rsi + bb) / 3)
@@ -1,4 +1,37 @@
-def explain_regime(regime, stats=None):
+REGIME_NAMES = {
+    0: "Trending",
+    1: "Mixed / Transitional",
+    2: "Mean-Reverting / Volatile",
+}
+
+
+def regime_archetype(regime, k=3):
+    """
+    Which of the three REGIME_NAMES a label of a k-regime model stands
+    for. Labels are in ascending volatility order, so the calmest is
+    trending, the most volatile mean-reverting and any in between mixed.
+    """
+    if regime == 0:
+        return 0
+    if regime == k - 1:
+        return 2
+    return 1
+
+
+def regime_names(k=3):
+    """
+    Display name of every label of a k-regime model; with more than one
+    mixed regime they are numbered from calmest to most volatile
+    """
+    names = {r: REGIME_NAMES[regime_archetype(r, k)] for r in range(k)}
+    if k > 3:
+        for r in range(1, k - 1):
+            names[r] = f"{REGIME_NAMES[1]} {r}"
+    return names
+
+
+def explain_regime(regime, stats=None, k=3):
+    regime = regime_archetype(regime, k)
     if regime == 0:
         return (
             "The market is currently in a trending regime. "
@@ -19,3 +52,25 @@ def explain_regime(regime, stats=None):
             "No single strategy consistently dominated in the past. "
             "A blended or risk-aware approach is recommended."
         )
+
+
+def recommended_strategy(regime, k=3):
+    regime = regime_archetype(regime, k)
+    if regime == 0:
+        return (
+            "Trend-Following Behavior",
+            "Trend-following strategies work best when price movements persist in one direction. "
+            "Moving Average–based approaches historically outperform in such environments."
+        )
+    elif regime == 2:
+        return (
+            "Mean-Reversion Behavior",
+            "In volatile and oscillating markets, prices tend to revert to their mean. "
+            "RSI-style strategies historically perform better in such conditions."
+        )
+    else:
+        return (
+            "Risk-Reduced / Blended Approach",
+            "Mixed regimes are unstable and unpredictable. No single strategy dominates, "
+            "so risk reduction or blended exposure is historically safer."
+        )
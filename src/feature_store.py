@@ -0,0 +1,269 @@
+"""
+Memory-mapped float32 feature tables.
+
+    python -m src.feature_store to-store features/market_features.csv features/market_features
+    python -m src.feature_store to-csv features/market_features /tmp/market_features.csv
+
+A store is a directory holding
+    meta.json     columns, original dtypes, row count, capacity, data file
+                  names, index tz, attrs
+    values.N.f32  float32 array of shape (n_columns, capacity), one column per row
+    dates.N.i64   int64 UTC nanosecond timestamps, length capacity
+
+N counts allocations, so a resize or rewrite never touches the files the
+published meta.json names. Version 1 stores use values.f32 and dates.i64.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 2
+META_FILE = "meta.json"
+VALUES_FILE = "values.{}.f32"
+DATES_FILE = "dates.{}.i64"
+
+# Data file names of a version 1 store
+V1_FILES = {"values_file": "values.f32", "dates_file": "dates.i64"}
+
+
+def read_feature_csv(path):
+    """
+    Read a features/*.csv file (Date index plus feature columns)
+    """
+    data = pd.read_csv(path, index_col=0, parse_dates=True)
+    data.index.name = data.index.name or "Date"
+    return data
+
+
+class FeatureStore:
+    """
+    Column-contiguous float32 feature table, memory-mapped on read.
+
+    matrix() returns the (rows, columns) view that kmeans_numpy takes,
+    without copying or parsing anything. Appends write into spare
+    capacity (grown geometrically); resizes and rewrites go to new data
+    files. Either way the only publish step is atomically replacing
+    meta.json, so readers never see a partial append. Integer columns
+    such as "regime" are stored as float32 and cast back by read().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @property
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, META_FILE))
+
+    @property
+    def meta(self):
+        with open(os.path.join(self.path, META_FILE)) as f:
+            return {**V1_FILES, **json.load(f)}
+
+    @property
+    def columns(self):
+        return self.meta["columns"]
+
+    def __len__(self):
+        return self.meta["rows"] if self.exists else 0
+
+    def matrix(self, columns=None):
+        """
+        (rows, d) float32 view of the stored values; zero-copy for all
+        columns or any run of adjacent ones, a copy of just the requested
+        columns otherwise
+        """
+        meta = self.meta
+        values = self._values(meta)[:, :meta["rows"]]
+        if columns is None:
+            return values.T
+
+        idx = [meta["columns"].index(c) for c in columns]
+        if idx == list(range(idx[0], idx[0] + len(idx))):
+            return values[idx[0]:idx[0] + len(idx)].T
+        return values[idx].T
+
+    def column(self, name):
+        meta = self.meta
+        return self._values(meta)[meta["columns"].index(name), :meta["rows"]]
+
+    def index(self):
+        meta = self.meta
+        dates = np.fromfile(os.path.join(self.path, meta["dates_file"]), dtype=np.int64, count=meta["rows"])
+        index = pd.DatetimeIndex(dates.view("datetime64[ns]"), name=meta["index_name"])
+        return index.tz_localize("UTC").tz_convert(meta["tz"]) if meta["tz"] else index
+
+    def read(self, columns=None):
+        """
+        Stored rows as a DataFrame with the original column dtypes restored
+        for integer columns (float columns stay float32)
+        """
+        meta = self.meta
+        columns = list(columns or meta["columns"])
+        values = self._values(meta)
+        data = {}
+        for name in columns:
+            col = values[meta["columns"].index(name), :meta["rows"]]
+            dtype = np.dtype(meta["dtypes"][name])
+            data[name] = col.astype(dtype) if dtype.kind in "iub" else np.array(col)
+        return pd.DataFrame(data, index=self.index())
+
+    def write(self, frame, attrs=None):
+        """
+        Replace the store with `frame` (DatetimeIndex, numeric columns)
+        """
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            meta = {
+                "format_version": FORMAT_VERSION,
+                "generation": self.meta.get("generation", 0) if self.exists else 0,
+                "columns": [str(c) for c in frame.columns],
+                "dtypes": {str(c): frame[c].dtype.str for c in frame.columns},
+                "rows": 0,
+                "capacity": max(len(frame), 1),
+                "index_name": frame.index.name or "Date",
+                "tz": str(frame.index.tz) if frame.index.tz is not None else None,
+                "attrs": attrs or {},
+            }
+            self._allocate(meta, meta["capacity"], copy_rows=0)
+            self._write_rows(meta, frame)
+        return self
+
+    def append(self, frame):
+        """
+        Append rows dated after the last stored one; creates the store if needed
+        """
+        if not self.exists:
+            return self.write(frame)
+
+        with self._lock:
+            meta = self.meta
+            missing = set(meta["columns"]) - set(map(str, frame.columns))
+            if missing:
+                raise ValueError(f"append is missing columns: {sorted(missing)}")
+            frame = frame[meta["columns"]]
+            if not len(frame):
+                return self
+
+            dates = _to_utc_ns(frame.index)
+            if np.any(np.diff(dates) <= 0):
+                raise ValueError("appended rows must have strictly increasing dates")
+            if meta["rows"]:
+                last = np.fromfile(os.path.join(self.path, meta["dates_file"]), dtype=np.int64,
+                                   count=1, offset=(meta["rows"] - 1) * 8)[0]
+                if dates[0] <= last:
+                    raise ValueError("appended rows must start after the last stored date")
+
+            needed = meta["rows"] + len(frame)
+            if needed > meta["capacity"]:
+                self._allocate(meta, max(needed, 2 * meta["capacity"]), copy_rows=meta["rows"])
+            self._write_rows(meta, frame)
+        return self
+
+    def _values(self, meta, mode="r"):
+        shape = (len(meta["columns"]), meta["capacity"])
+        return np.memmap(os.path.join(self.path, meta["values_file"]), dtype=np.float32, mode=mode,
+                         shape=shape)
+
+    def _allocate(self, meta, capacity, copy_rows):
+        # New data files under the next generation's names; nothing reads
+        # them until _write_rows publishes a meta.json that names them
+        d = len(meta["columns"])
+        generation = meta.get("generation", 0) + 1
+        values_file, dates_file = VALUES_FILE.format(generation), DATES_FILE.format(generation)
+
+        values = np.memmap(os.path.join(self.path, values_file), dtype=np.float32, mode="w+",
+                           shape=(d, capacity))
+        dates = np.memmap(os.path.join(self.path, dates_file), dtype=np.int64, mode="w+", shape=(capacity,))
+        if copy_rows:
+            values[:, :copy_rows] = self._values(meta)[:, :copy_rows]
+            dates[:copy_rows] = np.fromfile(os.path.join(self.path, meta["dates_file"]), dtype=np.int64,
+                                            count=copy_rows)
+        values.flush()
+        dates.flush()
+        del values, dates
+
+        meta.update(format_version=FORMAT_VERSION, generation=generation, capacity=capacity,
+                    values_file=values_file, dates_file=dates_file)
+
+    def _write_rows(self, meta, frame):
+        start, stop = meta["rows"], meta["rows"] + len(frame)
+
+        values = self._values(meta, mode="r+")
+        values[:, start:stop] = frame.to_numpy(dtype=np.float32).T
+        values.flush()
+        del values
+
+        dates = np.memmap(os.path.join(self.path, meta["dates_file"]), dtype=np.int64, mode="r+",
+                          shape=(meta["capacity"],))
+        dates[start:stop] = _to_utc_ns(frame.index)
+        dates.flush()
+        del dates
+
+        meta["rows"] = stop
+        tmp = os.path.join(self.path, f"{META_FILE}.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, os.path.join(self.path, META_FILE))
+        self._remove_stale(meta.get("generation", 0))
+
+    def _remove_stale(self, generation):
+        # Keep the previous generation for readers that loaded the old
+        # meta.json just before it was replaced
+        for name in os.listdir(self.path):
+            match = re.fullmatch(r"(?:values|dates)(?:\.(\d+))?\.(?:f32|i64)", name)
+            if match and int(match.group(1) or 0) < generation - 1:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    # Still mapped on a platform that forbids removing it; retried next time
+                    pass
+
+
+def csv_to_store(csv_path, store_path, attrs=None):
+    """
+    Convert a features/*.csv file into a FeatureStore
+    """
+    return FeatureStore(store_path).write(read_feature_csv(csv_path), attrs=attrs)
+
+
+def store_to_csv(store_path, csv_path):
+    """
+    Write a FeatureStore back out in the features/*.csv layout
+    """
+    FeatureStore(store_path).read().to_csv(csv_path)
+
+
+def _to_utc_ns(index):
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    return index.as_unit("ns").asi8
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    to_store = sub.add_parser("to-store", help="convert a features CSV into a store")
+    to_store.add_argument("csv")
+    to_store.add_argument("store")
+    to_csv = sub.add_parser("to-csv", help="write a store out as CSV")
+    to_csv.add_argument("store")
+    to_csv.add_argument("csv")
+    args = parser.parse_args(argv)
+
+    if args.command == "to-store":
+        store = csv_to_store(args.csv, args.store)
+        print(f"{len(store)} rows x {len(store.columns)} columns -> {args.store}")
+    else:
+        store_to_csv(args.store, args.csv)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,121 @@
+from collections import namedtuple
+import math
+import numpy as np
 import pandas as pd
+from src.instrumentation import timed
 
-def build_features(df):
+FEATURE_COLUMNS = ["returns", "volatility_20", "trend_strength", "range_20"]
+
+FeatureRow = namedtuple("FeatureRow", ["timestamp"] + FEATURE_COLUMNS)
+
+
+@timed("build_features")
+def build_features(df, vol_window=20, trend_window=50, range_window=20):
+    # Column names keep the default windows whatever windows are used,
+    # so fitted models and downstream code see one feature layout
     features = pd.DataFrame(index=df.index)
 
     features["returns"] = df["Close"].pct_change()
-    features["volatility_20"] = features["returns"].rolling(20).std()
-    features["trend_strength"] = df["Close"] / df["Close"].rolling(50).mean() - 1
-    features["range_20"] = (df["High"] - df["Low"]).rolling(20).mean()
+    features["volatility_20"] = features["returns"].rolling(vol_window).std()
+    features["trend_strength"] = df["Close"] / df["Close"].rolling(trend_window).mean() - 1
+    features["range_20"] = (df["High"] - df["Low"]).rolling(range_window).mean()
 
     return features.dropna()
+
+
+class IncrementalFeatureBuilder:
+    """
+    Stateful build_features: append one bar at a time in O(1).
+
+    Rolling windows are kept as ring buffers with running sums (and a sum
+    of squares for the return std). The sums are rebuilt from the buffer
+    once per window wrap so rounding drift stays bounded and rows match
+    the batch build_features to floating-point precision.
+    """
+
+    def __init__(self, vol_window=20, trend_window=50, range_window=20):
+        self._returns = _RollingWindow(vol_window)
+        self._closes = _RollingWindow(trend_window)
+        self._ranges = _RollingWindow(range_window)
+        self._prev_close = None
+        self.n_bars = 0
+
+    def update(self, timestamp, high, low, close):
+        """
+        Append one bar; returns a FeatureRow once every window is full, else None
+        """
+        close = float(close)
+        if self._prev_close is not None:
+            self._returns.push(close / self._prev_close - 1)
+        self._prev_close = close
+        self._closes.push(close)
+        self._ranges.push(float(high) - float(low))
+        self.n_bars += 1
+
+        if not (self._returns.full and self._closes.full and self._ranges.full):
+            return None
+
+        return FeatureRow(
+            timestamp,
+            self._returns.last,
+            self._returns.std(),
+            close / self._closes.mean() - 1,
+            self._ranges.mean(),
+        )
+
+    def update_frame(self, df):
+        """
+        Feed a block of OHLC bars; returns the emitted rows as a DataFrame
+        shaped like build_features output
+        """
+        rows = []
+        for ts, high, low, close in zip(df.index, df["High"].to_numpy(),
+                                        df["Low"].to_numpy(), df["Close"].to_numpy()):
+            row = self.update(ts, high, low, close)
+            if row is not None:
+                rows.append(row)
+
+        features = pd.DataFrame(rows, columns=FeatureRow._fields)
+        features = features.set_index("timestamp")
+        features.index = pd.Index(features.index, name=df.index.name)
+        return features
+
+
+class _RollingWindow:
+    def __init__(self, size):
+        self.size = size
+        self.buf = np.zeros(size, dtype=np.float64)
+        self.pos = 0
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.last = math.nan
+
+    @property
+    def full(self):
+        return self.count == self.size
+
+    def push(self, value):
+        old = self.buf[self.pos]
+        self.buf[self.pos] = value
+        self.pos = (self.pos + 1) % self.size
+        self.last = value
+
+        if self.count < self.size:
+            self.count += 1
+            self.total += value
+            self.total_sq += value * value
+        elif self.pos == 0:
+            self.total = math.fsum(self.buf)
+            self.total_sq = math.fsum(self.buf * self.buf)
+        else:
+            self.total += value - old
+            self.total_sq += value * value - old * old
+
+    def mean(self):
+        return self.total / self.count
+
+    def std(self):
+        n = self.count
+        var = (self.total_sq - self.total * self.total / n) / (n - 1)
+        return math.sqrt(max(var, 0.0))
@@ -0,0 +1,316 @@
+"""
+Concurrent market-data fetching behind the price store.
+
+Requests run on an asyncio loop with bounded concurrency, a token-bucket
+rate limit per backend host, retries with jittered exponential backoff and
+de-duplication of identical requests. The backend is pluggable:
+
+    YFinanceBackend()               the live provider (default)
+    LocalFileBackend(root)          recorded CSVs at <root>/<interval>/<ticker>.csv
+    HTTPBackend("http://host:port") the same layout served over HTTP
+
+REGIME_DATA_BACKEND selects one without code changes: "yfinance",
+"file:/path/to/recordings" or an http(s) URL.
+"""
+import asyncio
+import http.client
+import io
+import os
+import queue
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlencode, quote
+import pandas as pd
+from src.price_store import OHLCV_COLUMNS, read_yfinance_csv
+from src.instrumentation import span, incr
+
+FetchRequest = namedtuple("FetchRequest", ["ticker", "interval", "period", "start"], defaults=("1d", None, None))
+
+DEFAULT_CONCURRENCY = 32
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+
+# Intervals whose bars are stored as plain dates, as yf.download wrote them
+DAILY_INTERVALS = {"1d", "5d", "1wk", "1mo", "3mo"}
+
+
+class YFinanceBackend:
+    """
+    yfinance calls in worker threads. Ticker.history is used rather than
+    yf.download, which keeps its results in module globals and is not safe
+    to call concurrently; yfinance shares one HTTP session per process.
+    """
+
+    host = "finance.yahoo.com"
+    rate = 10.0
+
+    def __init__(self, max_workers=DEFAULT_CONCURRENCY):
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="yfinance")
+
+    async def fetch(self, request):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._history, request)
+
+    def _history(self, request):
+        import yfinance as yf
+
+        kwargs = {"period": request.period} if request.start is None else {"start": request.start}
+        return yf.Ticker(request.ticker).history(interval=request.interval, **kwargs)
+
+
+class LocalFileBackend:
+    """
+    Recorded bars from <root>/<interval>/<ticker>.csv (flat or yfinance
+    two-level header); a missing file means no data
+    """
+
+    host = "local"
+    rate = None
+
+    def __init__(self, root):
+        self.root = root
+
+    async def fetch(self, request):
+        return await asyncio.to_thread(self._read, request)
+
+    def _read(self, request):
+        path = os.path.join(self.root, request.interval, f"{_safe_name(request.ticker)}.csv")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return _since(read_bars_csv(f.read()), request.start)
+
+
+class HTTPBackend:
+    """
+    GET <base_url>/<interval>/<ticker>.csv?period=...&start=... over a pool
+    of persistent (keep-alive) connections; 404 means no data, other
+    non-200 responses are retried
+    """
+
+    rate = None
+
+    def __init__(self, base_url, pool_size=DEFAULT_CONCURRENCY, timeout=30):
+        parts = urlsplit(base_url)
+        self.host = parts.netloc
+        self._https = parts.scheme == "https"
+        self._prefix = parts.path.rstrip("/")
+        self._timeout = timeout
+        self._pool = queue.LifoQueue()
+        self._executor = ThreadPoolExecutor(pool_size, thread_name_prefix="http-fetch")
+
+    async def fetch(self, request):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._get, request)
+
+    def _get(self, request):
+        params = {k: str(v) for k, v in (("period", request.period), ("start", request.start)) if v is not None}
+        path = f"{self._prefix}/{quote(request.interval)}/{quote(request.ticker, safe='')}.csv"
+        if params:
+            path += "?" + urlencode(params)
+
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            conn = cls(self.host, timeout=self._timeout)
+
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            body = response.read()
+        except Exception:
+            conn.close()
+            raise
+
+        self._pool.put(conn)
+        if response.status == 404:
+            return None
+        if response.status != 200:
+            raise IOError(f"GET {path}: HTTP {response.status}")
+        return read_bars_csv(body.decode("utf-8"))
+
+
+class Fetcher:
+    """
+    Runs FetchRequests against a backend. Rate-limit state lives on the
+    Fetcher, so it holds across separate fetch_all() calls.
+    """
+
+    def __init__(self, backend=None, concurrency=DEFAULT_CONCURRENCY, rate=None,
+                 retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+        self.backend = backend or YFinanceBackend()
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        rate = rate or self.backend.rate
+        self._bucket = _TokenBucket(rate, burst=concurrency) if rate else None
+
+    async def fetch_many(self, requests):
+        """
+        Fetch every request concurrently; returns cleaned frames (or None)
+        in request order. Identical requests are only sent once.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = {}
+        for request in requests:
+            if request not in tasks:
+                tasks[request] = asyncio.ensure_future(self._fetch(request, semaphore))
+            else:
+                incr("fetch_deduplicated")
+        results = dict(zip(tasks, await asyncio.gather(*tasks.values())))
+        return [results[request] for request in requests]
+
+    async def _fetch(self, request, semaphore):
+        for attempt in range(self.retries + 1):
+            if self._bucket is not None:
+                await asyncio.sleep(self._bucket.reserve())
+            try:
+                async with semaphore:
+                    with span("download", interval=request.interval):
+                        return _clean(await self.backend.fetch(request), request.interval)
+            except Exception:
+                incr("download_errors", interval=request.interval)
+                if attempt == self.retries:
+                    return None
+                incr("download_retries", interval=request.interval)
+                await asyncio.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def fetch_all(requests, fetcher=None):
+    """
+    Blocking fetch of many FetchRequests; usable with or without a running loop
+    """
+    requests = list(requests)
+    if not requests:
+        return []
+    return run_sync((fetcher or get_fetcher()).fetch_many(requests))
+
+
+def run_sync(coro):
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    # Called from inside a running loop (e.g. a notebook): use a fresh one in a thread
+    result = {}
+
+    def target():
+        try:
+            result["value"] = asyncio.run(coro)
+        except BaseException as exc:
+            result["error"] = exc
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+def backend_from_spec(spec):
+    """
+    Backend for a REGIME_DATA_BACKEND value
+    """
+    if not spec or spec == "yfinance":
+        return YFinanceBackend()
+    if spec.startswith("file:"):
+        return LocalFileBackend(spec[len("file:"):])
+    if spec.startswith(("http://", "https://")):
+        return HTTPBackend(spec)
+    raise ValueError(f"Unknown data backend: {spec}")
+
+
+_FETCHER = None
+_FETCHER_LOCK = threading.Lock()
+
+
+def get_fetcher():
+    """
+    The process-wide Fetcher (backend from REGIME_DATA_BACKEND)
+    """
+    global _FETCHER
+    with _FETCHER_LOCK:
+        if _FETCHER is None:
+            _FETCHER = Fetcher(backend_from_spec(os.environ.get("REGIME_DATA_BACKEND")))
+        return _FETCHER
+
+
+def set_fetcher(fetcher):
+    """
+    Replace the process-wide Fetcher, e.g. with a LocalFileBackend in tests
+    """
+    global _FETCHER
+    with _FETCHER_LOCK:
+        _FETCHER = fetcher
+
+
+def read_bars_csv(text):
+    """
+    Parse OHLCV CSV text with a flat or yfinance two-level header
+    """
+    lines = text.splitlines()
+    if len(lines) > 1 and lines[1].startswith("Ticker"):
+        return read_yfinance_csv(io.StringIO(text))
+    data = pd.read_csv(io.StringIO(text), index_col=0)
+    data.index = pd.to_datetime(data.index, errors="coerce")
+    data.index.name = "Date"
+    return data[data.index.notna()]
+
+
+class _TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take a token; returns how long to wait before using it
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+def _clean(df, interval):
+    # Bars in the price store's layout: OHLCV floats, and for daily and
+    # longer intervals a tz-naive index of exchange-local dates (Ticker.history
+    # tags them with the exchange timezone at local midnight)
+    if df is None or df.empty:
+        return None
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    df = df[OHLCV_COLUMNS].apply(pd.to_numeric, errors="coerce").dropna()
+    if interval in DAILY_INTERVALS:
+        index = pd.DatetimeIndex(df.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        df.index = index.normalize().rename("Date")
+        df = df[~df.index.duplicated(keep="last")]
+    return df if len(df) else None
+
+
+def _since(df, start):
+    if start is None:
+        return df
+    start = pd.Timestamp(start)
+    if df.index.tz is None:
+        start = start.tz_localize(None) if start.tz is not None else start
+    else:
+        start = start.tz_localize(df.index.tz) if start.tz is None else start.tz_convert(df.index.tz)
+    return df[df.index >= start]
+
+
+def _safe_name(ticker):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in ticker)
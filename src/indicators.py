@@ -0,0 +1,21 @@
+def compute_rsi(series, window=14):
+    delta = series.diff()
+    gain = delta.clip(lower=0)
+    loss = -delta.clip(upper=0)
+
+    avg_gain = gain.rolling(window).mean()
+    avg_loss = loss.rolling(window).mean()
+
+    rs = avg_gain / avg_loss
+    rsi = 100 - (100 / (1 + rs))
+    return rsi
+
+
+def moving_average(series, window):
+    return series.rolling(window).mean()
+
+
+def bollinger_bands(series, window=20, n_std=2):
+    mid = series.rolling(window).mean()
+    std = series.rolling(window).std()
+    return mid - n_std * std, mid + n_std * std
@@ -0,0 +1,189 @@
+import functools
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PREFIX = "regime"
+
+
+class Metrics:
+    """
+    In-process span timers, counters and gauges.
+
+    Recording is a perf_counter pair plus a dict update under a lock, so it
+    is cheap enough to leave on. Series are keyed by name plus label pairs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._spans = {}
+
+    def incr(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _labels(labels))] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            stats = self._spans.get(key)
+            if stats is None:
+                stats = self._spans[key] = {"count": 0, "sum": 0.0, "max": 0.0, "last": 0.0}
+            stats["count"] += 1
+            stats["sum"] += seconds
+            stats["last"] = seconds
+            if seconds > stats["max"]:
+                stats["max"] = seconds
+
+    @contextmanager
+    def span(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+            peak = peak_rss_bytes()
+            if peak is not None:
+                self.gauge("process_peak_rss_bytes", peak)
+
+    def timed(self, name=None, **labels):
+        """
+        Decorator form of span()
+        """
+        def decorate(fn):
+            span_name = name or fn.__name__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._spans.clear()
+
+    def snapshot(self):
+        """
+        Plain-dict copy of every series
+        """
+        with self._lock:
+            return {
+                "spans": [
+                    {"name": n, "labels": dict(l), **stats} for (n, l), stats in sorted(self._spans.items())
+                ],
+                "counters": [
+                    {"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._counters.items())
+                ],
+                "gauges": [
+                    {"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._gauges.items())
+                ],
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """
+        Prometheus text exposition format
+        """
+        snap = self.snapshot()
+        lines = []
+
+        if snap["spans"]:
+            lines.append(f"# TYPE {PREFIX}_span_seconds summary")
+            for s in snap["spans"]:
+                labels = _format_labels({"span": s["name"], **s["labels"]})
+                lines.append(f"{PREFIX}_span_seconds_count{labels} {s['count']}")
+                lines.append(f"{PREFIX}_span_seconds_sum{labels} {s['sum']:.9f}")
+            lines.append(f"# TYPE {PREFIX}_span_seconds_max gauge")
+            for s in snap["spans"]:
+                labels = _format_labels({"span": s["name"], **s["labels"]})
+                lines.append(f"{PREFIX}_span_seconds_max{labels} {s['max']:.9f}")
+
+        for kind, suffix, series in (("counter", "_total", snap["counters"]), ("gauge", "", snap["gauges"])):
+            seen = set()
+            for s in series:
+                metric = f"{PREFIX}_{s['name']}{suffix}"
+                if metric not in seen:
+                    lines.append(f"# TYPE {metric} {kind}")
+                    seen.add(metric)
+                lines.append(f"{metric}{_format_labels(s['labels'])} {s['value']}")
+
+        return "\n".join(lines) + "\n"
+
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+    return "{" + body + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICS = Metrics()
+
+incr = METRICS.incr
+gauge = METRICS.gauge
+span = METRICS.span
+timed = METRICS.timed
+
+
+def start_metrics_server(port, host="0.0.0.0", metrics=METRICS):
+    """
+    Serve /metrics (Prometheus text) and /metrics.json from a daemon thread
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body, ctype = metrics.to_json(), "application/json"
+            elif self.path.startswith("/metrics"):
+                body, ctype = metrics.to_prometheus(), "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
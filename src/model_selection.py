@@ -0,0 +1,297 @@
+"""
+Choosing the number of regimes k.
+
+    python -m src.model_selection ^NSEI --period 10y --k 2 8
+    python -m src.model_selection --store features/nifty_1m --k 2 6 --workers 4 --save models/regime_model_1m.npz
+
+For every candidate k the clustering engine is fitted on a bounded random
+sample of the standardized feature rows, and three curves are returned:
+
+    inertia     within-cluster sum of squares of all rows, per row
+    silhouette  mean silhouette of a stratified subsample
+    stability   mean adjusted Rand index between fits on resampled halves
+
+Rows are only ever touched in chunks, so a memory-mapped FeatureStore
+matrix with millions of rows is never copied as a whole. Silhouettes use
+row blocks of the subsample's pairwise distances instead of the full
+O(n^2) matrix. Candidate k values run in a process pool when n_workers > 1.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import numpy as np
+import pandas as pd
+from src.regimes import kmeans_numpy, assign_labels, CHUNK_SIZE
+from src.features import FEATURE_COLUMNS
+from src.instrumentation import timed
+
+DEFAULT_K_RANGE = range(2, 9)
+
+# Feature rows the candidate models are fitted on
+FIT_SAMPLE = 200_000
+
+# Rows the silhouette is computed on
+SILHOUETTE_SAMPLE = 10_000
+
+# Upper bound on the pairwise-distance block held at once (elements)
+MAX_PAIRS = 4_000_000
+
+# Resampled fits per k for the stability curve
+STABILITY_RUNS = 6
+
+# choose_k prefers k values at least this stable
+MIN_STABILITY = 0.75
+
+# Set in each worker process by _init_worker
+_SAMPLE = None
+
+
+@timed("select_k")
+def select_k(X, k_values=DEFAULT_K_RANGE, fit_size=FIT_SAMPLE, silhouette_size=SILHOUETTE_SAMPLE,
+             stability_runs=STABILITY_RUNS, n_init=4, seed=0, n_workers=1, chunk_size=CHUNK_SIZE):
+    """
+    Inertia, silhouette and stability curves over k_values.
+
+    X is a feature DataFrame or any (n, d) float array, including
+    FeatureStore.matrix(). Features are standardized as in RegimeModel.
+    Returns a DataFrame indexed by k.
+    """
+    if isinstance(X, pd.DataFrame):
+        X = X.to_numpy(dtype=np.float64)
+    elif not isinstance(X, np.ndarray):
+        X = np.asarray(X)
+    k_values = sorted(set(int(k) for k in k_values))
+    if not k_values or k_values[0] < 2:
+        raise ValueError("k_values must be integers >= 2")
+    if len(X) < 2 * k_values[-1]:
+        raise ValueError(f"Need at least {2 * k_values[-1]} rows for k up to {k_values[-1]}, got {len(X)}")
+
+    mean, scale = _standardization(X, chunk_size)
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(X), min(fit_size, len(X)), replace=False))
+    sample = (X[rows] - mean) / scale
+
+    seeds = np.random.SeedSequence(seed).spawn(len(k_values))
+    tasks = [(k, silhouette_size, stability_runs, n_init, s) for k, s in zip(k_values, seeds)]
+    n_workers = min(n_workers or os.cpu_count() or 1, len(tasks))
+
+    if n_workers > 1:
+        with mp.Pool(n_workers, initializer=_init_worker, initargs=(sample,)) as pool:
+            results = pool.map(_evaluate_k, tasks)
+    else:
+        _init_worker(sample)
+        try:
+            results = list(map(_evaluate_k, tasks))
+        finally:
+            _init_worker(None)
+
+    table = pd.DataFrame([r[1:] for r in results], columns=["silhouette", "stability"],
+                         index=pd.Index(k_values, name="k"))
+    centroids = [r[0] for r in results]
+    if len(sample) == len(X):
+        table.insert(0, "inertia", [_inertia(sample, c, chunk_size) for c in centroids])
+    else:
+        table.insert(0, "inertia", _full_inertia(X, mean, scale, centroids, chunk_size))
+    return table
+
+
+def choose_k(curves, min_stability=MIN_STABILITY):
+    """
+    k with the highest silhouette among those at least `min_stability`
+    stable (all of them if none are); ties go to the smaller k
+    """
+    stable = curves[curves["stability"] >= min_stability]
+    candidates = stable if len(stable) else curves
+    return int(candidates["silhouette"].idxmax())
+
+
+def auto_k(features, k_values=DEFAULT_K_RANGE, **kwargs):
+    """
+    choose_k(select_k(...)) for a feature DataFrame, limited to the k
+    values the number of rows can support
+    """
+    k_values = [k for k in k_values if 2 * k <= len(features)]
+    return choose_k(select_k(features, k_values, **kwargs))
+
+
+def silhouette_scores(X, labels, k=None, max_pairs=MAX_PAIRS):
+    """
+    Silhouette of every row of X, from blocks of at most `max_pairs`
+    pairwise distances. Rows in singleton clusters score 0.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    labels = np.asarray(labels, dtype=np.int64)
+    k = k or int(labels.max()) + 1
+    n = len(X)
+    counts = np.bincount(labels, minlength=k).astype(np.float64)
+    onehot = np.zeros((n, k))
+    onehot[np.arange(n), labels] = 1.0
+
+    x_sq = np.einsum("ij,ij->i", X, X)
+    scores = np.zeros(n)
+    step = max(1, max_pairs // max(n, 1))
+    for start in range(0, n, step):
+        block = slice(start, start + step)
+        d2 = x_sq[block, None] - 2.0 * (X[block] @ X.T) + x_sq[None, :]
+        dist = np.sqrt(np.maximum(d2, 0.0, out=d2), out=d2)
+        sums = dist @ onehot
+
+        own = labels[block]
+        idx = np.arange(len(own))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # A row's distance to itself is 0, so only the divisor changes
+            a = sums[idx, own] / (counts[own] - 1)
+            means = sums / counts
+        means[idx, own] = np.inf
+        means[:, counts == 0] = np.inf
+        b = means.min(axis=1)
+        with np.errstate(invalid="ignore"):
+            s = (b - a) / np.maximum(a, b)
+        scores[block] = np.where((counts[own] > 1) & np.isfinite(s), s, 0.0)
+
+    return scores
+
+
+def stratified_sample(labels, size, rng, k=None):
+    """
+    Row indices sampling each cluster in proportion to its size, with at
+    least two rows from every cluster that has them. Returns (rows,
+    weights); weights undo the over-sampling of small clusters.
+    """
+    labels = np.asarray(labels)
+    k = k or int(labels.max()) + 1
+    counts = np.bincount(labels, minlength=k)
+    if counts.sum() <= size:
+        return np.arange(len(labels)), np.ones(len(labels))
+
+    take = np.minimum(counts, np.maximum(np.round(counts * size / counts.sum()).astype(np.int64), 2))
+    order = np.argsort(labels, kind="stable")
+    bounds = np.concatenate([[0], np.cumsum(counts)])
+    rows, weights = [], []
+    for c in range(k):
+        if take[c]:
+            members = order[bounds[c]:bounds[c + 1]]
+            rows.append(rng.choice(members, take[c], replace=False))
+            weights.append(np.full(take[c], counts[c] / take[c]))
+    return np.concatenate(rows), np.concatenate(weights)
+
+
+def adjusted_rand_index(a, b):
+    """
+    Adjusted Rand index between two labelings of the same rows
+    """
+    a, b = np.asarray(a, dtype=np.int64), np.asarray(b, dtype=np.int64)
+    ka, kb = int(a.max()) + 1, int(b.max()) + 1
+    table = np.bincount(a * kb + b, minlength=ka * kb).reshape(ka, kb).astype(np.float64)
+
+    def pairs(x):
+        return (x * (x - 1) / 2).sum()
+
+    index = pairs(table)
+    rows, cols = pairs(table.sum(axis=1)), pairs(table.sum(axis=0))
+    expected = rows * cols / pairs(np.float64(len(a)))
+    top = (rows + cols) / 2
+    if top == expected:
+        # Both labelings put every row in one cluster (or each in its own)
+        return 1.0
+    return float((index - expected) / (top - expected))
+
+
+def _standardization(X, chunk_size):
+    # Column mean and population std, accumulated in float64 chunks
+    total = np.zeros(X.shape[1])
+    total_sq = np.zeros(X.shape[1])
+    for start in range(0, len(X), chunk_size):
+        block = np.asarray(X[start:start + chunk_size], dtype=np.float64)
+        total += block.sum(axis=0)
+        total_sq += np.einsum("ij,ij->j", block, block)
+    mean = total / len(X)
+    std = np.sqrt(np.maximum(total_sq / len(X) - mean * mean, 0.0))
+    return mean, np.where(std > 0, std, 1.0)
+
+
+def _inertia(Z, centroids, chunk_size):
+    _, min_d2 = assign_labels(Z, centroids, chunk_size)
+    return float(min_d2.mean())
+
+
+def _full_inertia(X, mean, scale, centroids, chunk_size):
+    totals = np.zeros(len(centroids))
+    for start in range(0, len(X), chunk_size):
+        block = (np.asarray(X[start:start + chunk_size], dtype=np.float64) - mean) / scale
+        for i, c in enumerate(centroids):
+            totals[i] += assign_labels(block, c, chunk_size)[1].sum()
+    return totals / len(X)
+
+
+def _init_worker(sample):
+    global _SAMPLE
+    _SAMPLE = sample
+
+
+def _evaluate_k(task):
+    k, silhouette_size, stability_runs, n_init, seed = task
+    Z = _SAMPLE
+    rng = np.random.default_rng(seed)
+    fit = kmeans_numpy(Z, k=k, n_init=n_init, seed=int(rng.integers(2 ** 31)))
+
+    rows, weights = stratified_sample(fit.labels, silhouette_size, rng, k)
+    silhouette = float(np.average(silhouette_scores(Z[rows], fit.labels[rows], k), weights=weights))
+
+    # Fits on random halves, compared on the silhouette rows they all label
+    runs = []
+    for _ in range(stability_runs):
+        half = rng.choice(len(Z), len(Z) // 2, replace=False)
+        result = kmeans_numpy(Z[half], k=k, n_init=1, seed=int(rng.integers(2 ** 31)))
+        runs.append(assign_labels(Z[rows], result.centroids)[0])
+    scores = [adjusted_rand_index(runs[i], runs[j]) for i in range(len(runs)) for j in range(i)]
+    stability = float(np.mean(scores)) if scores else np.nan
+
+    return fit.centroids, silhouette, stability
+
+
+def _features(args):
+    if args.store:
+        from src.feature_store import FeatureStore
+        return FeatureStore(args.store).matrix(FEATURE_COLUMNS)
+
+    from src.data_loader import load_price_data
+    from src.features import build_features
+    features = build_features(load_price_data(args.ticker, period=args.period, refresh=not args.offline))
+    return features[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("ticker", nargs="?", help="ticker to load through the price store")
+    source.add_argument("--store", help="FeatureStore directory with the feature columns")
+    parser.add_argument("--period", default="10y")
+    parser.add_argument("--offline", action="store_true", help="use stored prices only")
+    parser.add_argument("--k", nargs=2, type=int, default=[DEFAULT_K_RANGE.start, DEFAULT_K_RANGE.stop - 1],
+                        metavar=("MIN", "MAX"))
+    parser.add_argument("--workers", type=int, default=1, help="processes (0 for all CPUs)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="fit a RegimeModel with the chosen k and save it here")
+    args = parser.parse_args(argv)
+
+    X = _features(args)
+    curves = select_k(X, range(args.k[0], args.k[1] + 1), seed=args.seed, n_workers=args.workers)
+    k = choose_k(curves)
+    print(curves.to_string(float_format=lambda v: f"{v:.4f}"))
+    print(f"chosen k = {k}")
+
+    if args.save:
+        from src.regime_model import RegimeModel
+        rng = np.random.default_rng(args.seed)
+        rows = np.sort(rng.choice(len(X), min(FIT_SAMPLE, len(X)), replace=False))
+        frame = pd.DataFrame(np.asarray(X[rows], dtype=np.float64), columns=FEATURE_COLUMNS)
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        RegimeModel(k=k).fit(frame).save(args.save)
+        print(f"saved -> {args.save}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
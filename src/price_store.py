@@ -0,0 +1,244 @@
+import os
+import struct
+import threading
+import zipfile
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_STORE_DIR = os.path.join(ROOT_DIR, "data", "store")
+DEFAULT_SEED_CSV = os.path.join(ROOT_DIR, "data", "nifty50.csv")
+
+OHLCV_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+# covered_from value meaning the store holds the provider's full history
+FULL_HISTORY = "max"
+_FULL_HISTORY_NS = np.iinfo(np.int64).min
+
+
+def read_yfinance_csv(path):
+    """
+    Read a CSV written by yf.download(...).to_csv() (two-level header)
+    """
+    data = pd.read_csv(path, header=[0, 1], index_col=0)
+    data.columns = data.columns.get_level_values(0)
+    data.index = pd.to_datetime(data.index, errors="coerce")
+    data = data[data.index.notna()]
+    data = data[OHLCV_COLUMNS].apply(pd.to_numeric, errors="coerce")
+    data.index.name = "Date"
+    return data.dropna()
+
+
+class PriceStore:
+    """
+    On-disk columnar OHLCV store with one file per (ticker, interval).
+
+    Each file holds the timestamp index and every OHLCV column as separate
+    contiguous arrays, plus the range of history it is known to cover and
+    when it was last refreshed from the data provider.
+    """
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+
+    def path(self, ticker, interval="1d"):
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in ticker)
+        return os.path.join(self.root, interval, f"{safe}.npz")
+
+    def exists(self, ticker, interval="1d"):
+        return os.path.exists(self.path(ticker, interval))
+
+    def read(self, ticker, interval="1d"):
+        """
+        Return the stored bars as a DataFrame, or None if nothing is stored
+        """
+        frame, _ = self._load(ticker, interval)
+        return frame
+
+    def read_chunks(self, ticker, interval="1d", chunk_rows=250_000, start=None):
+        """
+        Stored bars from `start` on as DataFrames of at most chunk_rows rows.
+
+        The columns are memory-mapped straight out of the (uncompressed)
+        npz, so only one chunk is in memory at a time. A concurrent
+        append replaces the file and does not affect a running read.
+        """
+        path = self.path(ticker, interval)
+        if not os.path.exists(path):
+            return
+
+        with np.load(path, allow_pickle=False) as f:
+            tz = str(f["tz"])
+        index = _npz_memmap(path, "index")
+        columns = {c: _npz_memmap(path, c) for c in OHLCV_COLUMNS}
+
+        first = 0
+        if start is not None:
+            first = int(np.searchsorted(index, _to_ns(_align_tz(pd.Timestamp(start), tz or None)), side="left"))
+        for lo in range(first, len(index), chunk_rows):
+            dates = pd.DatetimeIndex(np.asarray(index[lo:lo + chunk_rows]).astype("datetime64[ns]"), name="Date")
+            if tz:
+                dates = dates.tz_localize("UTC").tz_convert(tz)
+            yield pd.DataFrame({c: np.asarray(col[lo:lo + chunk_rows]) for c, col in columns.items()},
+                               index=dates)
+
+    def info(self, ticker, interval="1d"):
+        """
+        Return {"covered_from", "fetched_at", "rows"} without loading columns.
+        covered_from is FULL_HISTORY when the whole provider history is stored
+        """
+        path = self.path(ticker, interval)
+        if not os.path.exists(path):
+            return None
+
+        with np.load(path, allow_pickle=False) as f:
+            return {
+                "covered_from": _to_timestamp(int(f["covered_from"]), str(f["tz"])),
+                "fetched_at": pd.Timestamp(int(f["fetched_at"]), tz="UTC"),
+                "rows": len(f["index"]),
+            }
+
+    def append(self, ticker, df, interval="1d", covered_from=None):
+        """
+        Merge new bars into the store; overlapping timestamps take the new values.
+
+        Timezone-aware bars going into a tz-naive store keep their local wall
+        time (the naive store holds exchange-local timestamps); tz-naive bars
+        cannot be placed in a timezone-aware store and are rejected.
+        """
+        df = _normalize(df)
+        stored, meta = self._load(ticker, interval)
+
+        if stored is not None and len(stored):
+            df = _match_tz(df, stored.index.tz)
+            merged = pd.concat([stored, df])
+            merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+        else:
+            merged = df.sort_index()
+
+        covered = meta["covered_from"] if meta else merged.index[0]
+        if covered_from is not None and covered != FULL_HISTORY:
+            if covered_from == FULL_HISTORY:
+                covered = FULL_HISTORY
+            else:
+                covered = min(covered, _align_tz(pd.Timestamp(covered_from), merged.index.tz))
+
+        self._write(ticker, interval, merged, covered)
+        return merged
+
+    def touch(self, ticker, interval="1d"):
+        """
+        Mark the stored series as freshly checked against the provider
+        """
+        stored, meta = self._load(ticker, interval)
+        if stored is not None:
+            self._write(ticker, interval, stored, meta["covered_from"])
+
+    def seed_from_csv(self, csv_path=DEFAULT_SEED_CSV, ticker="^NSEI", interval="1d"):
+        """
+        Populate the store from a notebook-style yfinance CSV export
+        """
+        df = read_yfinance_csv(csv_path)
+        return self.append(ticker, df, interval, covered_from=df.index[0])
+
+    def _load(self, ticker, interval):
+        path = self.path(ticker, interval)
+        if not os.path.exists(path):
+            return None, None
+
+        with np.load(path, allow_pickle=False) as f:
+            tz = str(f["tz"])
+            index = pd.DatetimeIndex(f["index"].astype("datetime64[ns]"), name="Date")
+            if tz:
+                index = index.tz_localize("UTC").tz_convert(tz)
+            frame = pd.DataFrame({c: f[c] for c in OHLCV_COLUMNS}, index=index)
+            meta = {"covered_from": _to_timestamp(int(f["covered_from"]), tz)}
+
+        return frame, meta
+
+    def _write(self, ticker, interval, df, covered_from):
+        path = self.path(ticker, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        index = df.index
+        tz = str(index.tz) if index.tz is not None else ""
+        if tz:
+            index = index.tz_convert("UTC").tz_localize(None)
+
+        covered = _FULL_HISTORY_NS if covered_from == FULL_HISTORY else _to_ns(covered_from)
+        arrays = {c: df[c].to_numpy(dtype=np.float64) for c in OHLCV_COLUMNS}
+
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                index=index.as_unit("ns").asi8,
+                tz=np.array(tz),
+                covered_from=np.int64(covered),
+                fetched_at=np.int64(pd.Timestamp.now(tz="UTC").value),
+                **arrays,
+            )
+        os.replace(tmp, path)
+
+
+def _normalize(df):
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.copy()
+        df.columns = df.columns.get_level_values(0)
+    df = df[OHLCV_COLUMNS].astype(np.float64).dropna()
+    df.index = pd.DatetimeIndex(df.index, name="Date")
+    return df
+
+
+def _npz_memmap(path, name):
+    # Read-only memmap of one array stored in an npz (np.savez writes
+    # members uncompressed, so each array's bytes sit contiguously in the file)
+    with zipfile.ZipFile(path) as archive:
+        member = archive.getinfo(f"{name}.npy")
+    if member.compress_type != zipfile.ZIP_STORED:
+        with np.load(path, allow_pickle=False) as f:
+            return f[name]
+
+    with open(path, "rb") as f:
+        f.seek(member.header_offset)
+        header = f.read(30)
+        name_len, extra_len = struct.unpack("<HH", header[26:30])
+        f.seek(member.header_offset + 30 + name_len + extra_len)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if not shape or not shape[0]:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape, offset=offset,
+                     order="F" if fortran else "C")
+
+
+def _match_tz(df, tz):
+    if df.index.tz is None and tz is not None:
+        raise ValueError(f"Cannot merge tz-naive bars into a store indexed in {tz}")
+    if df.index.tz is not None:
+        df = df.tz_convert(tz) if tz is not None else df.tz_localize(None)
+    return df
+
+
+def _align_tz(ts, tz):
+    if tz is None:
+        return ts.tz_localize(None) if ts.tz is not None else ts
+    return ts.tz_localize(tz) if ts.tz is None else ts.tz_convert(tz)
+
+
+def _to_ns(ts):
+    ts = pd.Timestamp(ts)
+    if ts.tz is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts.value
+
+
+def _to_timestamp(ns, tz):
+    if ns == _FULL_HISTORY_NS:
+        return FULL_HISTORY
+    ts = pd.Timestamp(ns)
+    return ts.tz_localize("UTC").tz_convert(tz) if tz else ts
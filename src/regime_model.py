@@ -0,0 +1,161 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from src.regimes import kmeans_numpy, assign_labels, assign_soft
+from src.instrumentation import timed
+
+
+class RegimeModel:
+    """
+    K-means regime model that is fitted once and then only predicts.
+
+    Features are standardized with the mean and std seen at fit time, and
+    centroids are stored in canonical order (ascending `order_by` feature),
+    so label 0 is always the calmest regime and label k-1 the most volatile.
+    sigma2_ is the pooled within-cluster variance per standardized feature,
+    used to turn centroid distances into soft memberships.
+    """
+
+    def __init__(self, k=3, seed=42, n_init=4, order_by="volatility_20"):
+        self.k = k
+        self.seed = seed
+        self.n_init = n_init
+        self.order_by = order_by
+
+        self.feature_names_ = None
+        self.mean_ = None
+        self.scale_ = None
+        self.centroids_ = None
+        self.inertia_ = None
+        self.n_iter_ = None
+        self.n_samples_ = None
+        self.sigma2_ = None
+
+    def fit(self, features, init=None):
+        """
+        Fit on a feature DataFrame (one row per bar). `init` optionally
+        warm-starts from centroids given in the original feature units.
+        """
+        self.feature_names_ = list(features.columns)
+        X = features.to_numpy(dtype=np.float64)
+
+        self.mean_ = X.mean(axis=0)
+        scale = X.std(axis=0)
+        self.scale_ = np.where(scale > 0, scale, 1.0)
+
+        Z = (X - self.mean_) / self.scale_
+        if init is not None:
+            init = (np.asarray(init, dtype=np.float64) - self.mean_) / self.scale_
+            result = kmeans_numpy(Z, k=self.k, seed=self.seed, init=init)
+        else:
+            result = kmeans_numpy(Z, k=self.k, seed=self.seed, n_init=self.n_init)
+
+        col = self.feature_names_.index(self.order_by) if self.order_by in self.feature_names_ else 0
+        order = np.argsort(result.centroids[:, col], kind="stable")
+
+        self.centroids_ = result.centroids[order]
+        self.inertia_ = result.inertia
+        self.n_iter_ = result.n_iter
+        self.n_samples_ = len(X)
+        self.sigma2_ = _pooled_variance(self.inertia_, len(X), X.shape[1])
+        return self
+
+    def relabel(self, order):
+        """
+        Reorder centroids so that new label i is the current label order[i]
+        """
+        self._check_fitted()
+        self.centroids_ = self.centroids_[np.asarray(order)]
+        return self
+
+    def transform(self, features):
+        """
+        Standardize features with the fitted parameters
+        """
+        self._check_fitted()
+        if isinstance(features, pd.DataFrame):
+            features = features[self.feature_names_].to_numpy(dtype=np.float64)
+        return (np.asarray(features, dtype=np.float64) - self.mean_) / self.scale_
+
+    @timed("regime_predict")
+    def predict(self, features):
+        """
+        Nearest-centroid regime label for each row, O(k*d) per row
+        """
+        labels, _ = assign_labels(self.transform(features), self.centroids_)
+        return labels
+
+    @timed("regime_assign")
+    def assign(self, features):
+        """
+        Labels, soft membership (n, k) and margin over the runner-up
+        centroid for each row, from one pass over the distances
+        """
+        return assign_soft(self.transform(features), self.centroids_, self.sigma2_)
+
+    @property
+    def centroids(self):
+        """
+        Centroids in the original feature units
+        """
+        self._check_fitted()
+        return self.centroids_ * self.scale_ + self.mean_
+
+    @property
+    def version(self):
+        """
+        Short hash identifying the fitted parameters
+        """
+        self._check_fitted()
+        h = hashlib.sha1()
+        for arr in (self.mean_, self.scale_, self.centroids_, np.float64(self.sigma2_)):
+            h.update(np.ascontiguousarray(arr).tobytes())
+        h.update(",".join(self.feature_names_).encode())
+        return h.hexdigest()[:12]
+
+    def save(self, path):
+        self._check_fitted()
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                k=self.k,
+                seed=self.seed,
+                n_init=self.n_init,
+                order_by=np.array(self.order_by),
+                feature_names=np.array(self.feature_names_),
+                mean=self.mean_,
+                scale=self.scale_,
+                centroids=self.centroids_,
+                inertia=self.inertia_,
+                n_iter=self.n_iter_,
+                n_samples=self.n_samples_,
+                sigma2=self.sigma2_,
+            )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as f:
+            model = cls(k=int(f["k"]), seed=int(f["seed"]), n_init=int(f["n_init"]),
+                        order_by=str(f["order_by"]))
+            model.feature_names_ = [str(c) for c in f["feature_names"]]
+            model.mean_ = f["mean"]
+            model.scale_ = f["scale"]
+            model.centroids_ = f["centroids"]
+            model.inertia_ = float(f["inertia"])
+            model.n_iter_ = int(f["n_iter"])
+            model.n_samples_ = int(f["n_samples"])
+            if "sigma2" in f.files:
+                model.sigma2_ = float(f["sigma2"])
+            else:
+                # Saved before sigma2 was stored; it follows from the fit results
+                model.sigma2_ = _pooled_variance(model.inertia_, model.n_samples_, len(model.feature_names_))
+        return model
+
+    def _check_fitted(self):
+        if self.centroids_ is None:
+            raise RuntimeError("RegimeModel is not fitted yet")
+
+
+def _pooled_variance(inertia, n_samples, n_features):
+    # All points on their centroids leaves no spread to measure
+    return inertia / (n_samples * n_features) if inertia > 0 else 1.0
@@ -1,22 +1,206 @@
+from collections import namedtuple
 import numpy as np
+from src.instrumentation import timed, incr, gauge
 
-def kmeans_numpy(X, k=3, max_iters=100, seed=42):
-    np.random.seed(seed)
+# Rows per block in the distance kernel; bounds the n x k temporary to
+# CHUNK_SIZE x k regardless of how many rows are clustered
+CHUNK_SIZE = 65536
 
-    indices = np.random.choice(len(X), k, replace=False)
-    centroids = X[indices]
+KMeansResult = namedtuple("KMeansResult", ["labels", "centroids", "inertia", "n_iter", "converged"])
 
-    for _ in range(max_iters):
-        distances = np.linalg.norm(X[:, None] - centroids, axis=2)
-        labels = np.argmin(distances, axis=1)
+Assignment = namedtuple("Assignment", ["labels", "min_d2", "membership", "margin"])
 
-        new_centroids = np.array([
-            X[labels == i].mean(axis=0) for i in range(k)
-        ])
 
-        if np.allclose(centroids, new_centroids, atol=1e-4):
-            break
+@timed("kmeans_numpy")
+def kmeans_numpy(X, k=3, max_iters=100, seed=42, n_init=1, tol=1e-4,
+                 init="k-means++", chunk_size=CHUNK_SIZE):
+    """
+    K-means with k-means++ seeding and a chunked distance kernel.
+
+    X may be float32 or float64 and is never copied as a whole; distances
+    are computed block by block with ||x||^2 - 2 x.c + ||c||^2. `init` is
+    "k-means++", "random" or an explicit (k, d) array of starting centroids.
+    The best of `n_init` runs (lowest inertia) is returned.
+    """
+    X = _as_float_matrix(X)
+    if len(X) < k:
+        raise ValueError(f"Need at least k={k} rows to cluster, got {len(X)}")
+
+    rng = np.random.default_rng(seed)
+    if not isinstance(init, str):
+        n_init = 1
+
+    best = None
+    for _ in range(n_init):
+        centroids = _init_centroids(X, k, init, rng, chunk_size)
+        result = _lloyd(X, centroids, max_iters, tol, chunk_size)
+        incr("kmeans_runs", converged=result.converged)
+        incr("kmeans_iterations", result.n_iter)
+        if best is None or result.inertia < best.inertia:
+            best = result
+
+    gauge("kmeans_last_iterations", best.n_iter)
+    gauge("kmeans_last_inertia", best.inertia)
+    gauge("kmeans_last_rows", len(X))
+    return best
+
+
+def assign_labels(X, centroids, chunk_size=CHUNK_SIZE):
+    """
+    Nearest-centroid labels and squared distances, computed in row chunks
+    """
+    X = _as_float_matrix(X)
+    centroids = np.asarray(centroids, dtype=np.float64)
+    labels = np.empty(len(X), dtype=np.int64)
+    min_d2 = np.empty(len(X), dtype=np.float64)
+
+    c_sq = np.einsum("ij,ij->i", centroids, centroids)
+    for start in range(0, len(X), chunk_size):
+        block = X[start:start + chunk_size]
+        d2 = _sq_distances(block, centroids, c_sq)
+        lab = np.argmin(d2, axis=1)
+        labels[start:start + len(block)] = lab
+        min_d2[start:start + len(block)] = d2[np.arange(len(block)), lab]
+
+    return labels, min_d2
+
+
+def assign_soft(X, centroids, sigma2, chunk_size=CHUNK_SIZE):
+    """
+    assign_labels plus soft membership and margin from the same distances.
+
+    membership (n, k) is the posterior of an equal-weight isotropic
+    Gaussian mixture with variance sigma2 per dimension, i.e. a softmax of
+    -d2 / (2 sigma2); its argmax is the hard label. margin is the log
+    likelihood ratio of the nearest centroid over the runner-up,
+    (d2_second - d2_nearest) / (2 sigma2), and is inf when k == 1.
+    """
+    X = _as_float_matrix(X)
+    centroids = np.asarray(centroids, dtype=np.float64)
+    n, k = len(X), len(centroids)
+    labels = np.empty(n, dtype=np.int64)
+    min_d2 = np.empty(n, dtype=np.float64)
+    membership = np.empty((n, k), dtype=np.float32)
+    margin = np.full(n, np.inf)
+    scale = 1.0 / (2.0 * sigma2)
+
+    c_sq = np.einsum("ij,ij->i", centroids, centroids)
+    for start in range(0, n, chunk_size):
+        block = X[start:start + chunk_size]
+        rows = slice(start, start + len(block))
+        d2 = _sq_distances(block, centroids, c_sq)
+        lab = np.argmin(d2, axis=1)
+        nearest = d2[np.arange(len(block)), lab]
+        labels[rows] = lab
+        min_d2[rows] = nearest
+
+        # Shift by the nearest distance so the largest weight is exp(0) = 1
+        weights = np.exp((nearest[:, None] - d2) * scale)
+        membership[rows] = weights / weights.sum(axis=1, keepdims=True)
+        if k > 1:
+            margin[rows] = (np.partition(d2, 1, axis=1)[:, 1] - nearest) * scale
+
+    return Assignment(labels, min_d2, membership, margin)
+
+
+def _as_float_matrix(X):
+    X = np.asarray(X)
+    if X.dtype not in (np.float32, np.float64):
+        X = X.astype(np.float64)
+    if X.ndim != 2:
+        raise ValueError(f"Expected a 2-D feature matrix, got shape {X.shape}")
+    return X
+
+
+def _sq_distances(block, centroids, c_sq):
+    block = block.astype(np.float64, copy=False)
+    x_sq = np.einsum("ij,ij->i", block, block)
+    d2 = x_sq[:, None] - 2.0 * (block @ centroids.T) + c_sq[None, :]
+    # Cancellation can leave tiny negatives for points sitting on a centroid
+    np.maximum(d2, 0.0, out=d2)
+    return d2
 
+
+def _init_centroids(X, k, init, rng, chunk_size):
+    if not isinstance(init, str):
+        centroids = np.array(init, dtype=np.float64)
+        if centroids.shape != (k, X.shape[1]):
+            raise ValueError(f"init centroids must have shape {(k, X.shape[1])}, got {centroids.shape}")
+        return centroids
+
+    if init == "random":
+        return X[rng.choice(len(X), k, replace=False)].astype(np.float64)
+
+    if init != "k-means++":
+        raise ValueError(f"Unknown init: {init}")
+
+    centroids = np.empty((k, X.shape[1]), dtype=np.float64)
+    centroids[0] = X[rng.integers(len(X))]
+    _, closest = assign_labels(X, centroids[:1], chunk_size)
+
+    for i in range(1, k):
+        total = closest.sum()
+        if total > 0:
+            idx = rng.choice(len(X), p=closest / total)
+        else:
+            # All points coincide with chosen centroids
+            idx = rng.integers(len(X))
+        centroids[i] = X[idx]
+        _, d2 = assign_labels(X, centroids[i:i + 1], chunk_size)
+        np.minimum(closest, d2, out=closest)
+
+    return centroids
+
+
+def _lloyd(X, centroids, max_iters, tol, chunk_size):
+    k, d = centroids.shape
+    converged = False
+    n_iter = 0
+
+    for n_iter in range(1, max_iters + 1):
+        sums = np.zeros((k, d), dtype=np.float64)
+        counts = np.zeros(k, dtype=np.int64)
+        labels, min_d2 = _assign_and_accumulate(X, centroids, sums, counts, chunk_size)
+
+        new_centroids = centroids.copy()
+        filled = counts > 0
+        new_centroids[filled] = sums[filled] / counts[filled, None]
+
+        empty = np.flatnonzero(~filled)
+        if len(empty) and min_d2.max() == 0.0:
+            # Fewer distinct points than clusters; nothing left to re-seed from
+            empty = empty[:0]
+        if len(empty):
+            # Re-seed empty clusters with the points farthest from their centroid
+            far = np.argsort(min_d2)[::-1][:len(empty)]
+            new_centroids[empty] = X[far]
+            min_d2[far] = 0.0
+
+        shift = np.abs(new_centroids - centroids).max()
         centroids = new_centroids
+        if shift <= tol and not len(empty):
+            converged = True
+            break
+
+    labels, min_d2 = assign_labels(X, centroids, chunk_size)
+    return KMeansResult(labels, centroids, float(min_d2.sum()), n_iter, converged)
+
+
+def _assign_and_accumulate(X, centroids, sums, counts, chunk_size):
+    k = len(centroids)
+    labels = np.empty(len(X), dtype=np.int64)
+    min_d2 = np.empty(len(X), dtype=np.float64)
+    c_sq = np.einsum("ij,ij->i", centroids, centroids)
+
+    for start in range(0, len(X), chunk_size):
+        block = X[start:start + chunk_size].astype(np.float64, copy=False)
+        d2 = _sq_distances(block, centroids, c_sq)
+        lab = np.argmin(d2, axis=1)
+        labels[start:start + len(block)] = lab
+        min_d2[start:start + len(block)] = d2[np.arange(len(block)), lab]
+
+        counts += np.bincount(lab, minlength=k)
+        for j in range(block.shape[1]):
+            sums[:, j] += np.bincount(lab, weights=block[:, j], minlength=k)
 
-    return labels
+    return labels, min_d2
@@ -1,7 +1,13 @@
 from datetime import date
-
-def generate_weekly_report(regime, regime_name, strategy, explanation):
-    today = date.today().strftime("%Y-%m-%d")
+import pandas as pd
+
+def generate_weekly_report(regime, regime_name, strategy, explanation, report_date=None):
+    """
+    Plain-text weekly report; report_date (anything pd.Timestamp accepts)
+    defaults to today
+    """
+    report_date = date.today() if report_date is None else pd.Timestamp(report_date)
+    today = report_date.strftime("%Y-%m-%d")
 
     report = f"""
 WEEKLY MARKET REGIME REPORT
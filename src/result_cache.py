@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import threading
+import zipfile
+import numpy as np
+import pandas as pd
+from src.features import build_features
+from src.backtest import run_backtest
+from src.regimes import Assignment
+from src.instrumentation import incr
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_CACHE_DIR = os.path.join(ROOT_DIR, ".cache", "results")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Part of every key; bump it whenever the features, model assignment or
+# backtest code changes what a cached result would contain, so stale
+# entries stop matching and age out through eviction
+CACHE_VERSION = 1
+
+
+def cache_key(namespace, arrays=(), params=None):
+    """
+    Content hash of the input arrays plus JSON-serializable parameters,
+    salted with CACHE_VERSION
+    """
+    h = hashlib.sha256(f"{namespace}:v{CACHE_VERSION}".encode())
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr)
+        h.update(f"{arr.dtype.str}{arr.shape}".encode())
+        h.update(arr.tobytes())
+    h.update(json.dumps(params or {}, sort_keys=True, default=str).encode())
+    return f"{namespace}-{h.hexdigest()[:32]}"
+
+
+def price_arrays(price_df):
+    """
+    The arrays that identify a price history for hashing
+    """
+    index = price_df.index
+    if getattr(index, "tz", None) is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    return [index.to_numpy(dtype="datetime64[ns]").view(np.int64)] + [
+        price_df[c].to_numpy(dtype=np.float64) for c in ("High", "Low", "Close")
+    ]
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk cache shared by every process on the machine.
+
+    Entries are uncompressed .npz files named by cache_key(). Writes go to a
+    temporary file and are renamed into place, so readers only ever see
+    complete entries; a reader racing an eviction just gets a miss. Reads
+    bump the file's mtime and the oldest entries are evicted once the
+    directory grows past max_bytes.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key):
+        return os.path.join(self.root, f"{key}.npz")
+
+    def get(self, key):
+        """
+        Stored {name: array} for key, or None
+        """
+        path = self.path(key)
+        try:
+            with np.load(path, allow_pickle=False) as f:
+                arrays = {name: f[name] for name in f.files}
+            os.utime(path)
+        except (OSError, ValueError, zipfile.BadZipFile):
+            self.misses += 1
+            incr("result_cache_requests", namespace=key.split("-")[0], result="miss")
+            return None
+
+        self.hits += 1
+        incr("result_cache_requests", namespace=key.split("-")[0], result="hit")
+        return arrays
+
+    def put(self, key, arrays):
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+        self.evict()
+
+    def get_frame(self, key):
+        arrays = self.get(key)
+        return None if arrays is None else _frame_from_arrays(arrays)
+
+    def put_frame(self, key, frame):
+        self.put(key, _frame_to_arrays(frame))
+
+    def evict(self):
+        """
+        Delete least recently used entries until the cache fits in max_bytes
+        """
+        entries = []
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return
+
+        for name in names:
+            if not name.endswith(".npz"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.root, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.root) if os.path.isdir(self.root) else []:
+            if name.endswith(".npz"):
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except FileNotFoundError:
+                    pass
+
+
+# ---------- PIPELINE HELPERS ----------
+
+def cached_build_features(price_df, cache, **windows):
+    key = cache_key("features", price_arrays(price_df), windows)
+    features = cache.get_frame(key)
+    if features is None:
+        features = build_features(price_df, **windows)
+        cache.put_frame(key, features)
+    return features
+
+
+def cached_assign(features, model, cache):
+    features = features[model.feature_names_]
+    key = cache_key("assignment", [features.to_numpy(dtype=np.float64)], {"model": model.version})
+    arrays = cache.get(key)
+    if arrays is None:
+        arrays = model.assign(features)._asdict()
+        cache.put(key, arrays)
+    return Assignment(**{name: arrays[name] for name in Assignment._fields})
+
+
+def cached_backtest(close, regimes, signals, cache, policies=None):
+    names = list(signals)
+    arrays = [np.asarray(close, dtype=np.float64)] + [np.asarray(signals[n], dtype=np.float64) for n in names]
+    if regimes is not None:
+        arrays.append(np.asarray(regimes))
+    params = {
+        "signals": names,
+        "policies": {name: f"{p.__module__}.{p.__qualname__}" for name, p in (policies or {}).items()},
+    }
+    key = cache_key("backtest", arrays, params)
+
+    table = cache.get_frame(key)
+    if table is None:
+        table = run_backtest(close, regimes, signals, policies=policies)
+        cache.put_frame(key, table)
+    return table
+
+
+def _frame_to_arrays(frame):
+    n_index = 0 if isinstance(frame.index, pd.RangeIndex) else frame.index.nlevels
+    index_names = list(frame.index.names)
+    if n_index:
+        frame = frame.reset_index()
+
+    arrays = {
+        "__columns__": np.array([str(c) for c in frame.columns]),
+        "__index_names__": np.array(["" if n is None else str(n) for n in index_names]),
+        "__n_index__": np.array(n_index),
+    }
+    for i, col in enumerate(frame.columns):
+        values = frame[col]
+        if isinstance(values.dtype, pd.DatetimeTZDtype):
+            arrays[f"__tz_{i}__"] = np.array(str(values.dt.tz))
+            values = values.dt.tz_convert("UTC").dt.tz_localize(None)
+        values = values.to_numpy()
+        if values.dtype == object:
+            values = values.astype(str)
+        arrays[f"c{i}"] = values
+    return arrays
+
+
+def _frame_from_arrays(arrays):
+    columns = [str(c) for c in arrays["__columns__"]]
+    data = {}
+    for i, col in enumerate(columns):
+        values = arrays[f"c{i}"]
+        if f"__tz_{i}__" in arrays:
+            values = pd.DatetimeIndex(values).tz_localize("UTC").tz_convert(str(arrays[f"__tz_{i}__"]))
+        data[col] = values
+    frame = pd.DataFrame(data)
+
+    n_index = int(arrays["__n_index__"])
+    if not n_index:
+        return frame
+    frame = frame.set_index(columns[:n_index])
+    frame.index.names = [n or None for n in (str(n) for n in arrays["__index_names__"])]
+    return frame
@@ -0,0 +1,204 @@
+import logging
+from collections import namedtuple
+from concurrent.futures import Future
+import threading
+import pandas as pd
+from src.data_loader import load_price_data, NIFTY_TICKER
+from src.current_regime import compute_current_regime, get_regime_model
+from src.result_cache import ResultCache
+from src.transitions import regime_outlook
+from src.explain import regime_names
+from src.instrumentation import span, incr, gauge
+
+RegimeSnapshot = namedtuple(
+    "RegimeSnapshot",
+    ["ticker", "period", "current_regime", "features", "prices", "outlook", "model_version",
+     "regime_names", "computed_at"],
+)
+
+# Default seconds between background refreshes of tracked snapshots
+REFRESH_INTERVAL = 15 * 60
+
+# History the transition statistics are estimated on
+HISTORY_PERIOD = "10y"
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotService:
+    """
+    Process-wide, shared regime snapshots.
+
+    Concurrent get() calls for the same (ticker, period) wait on a single
+    in-flight computation. Finished snapshots are shared read-only between
+    callers; every key that has been requested is recomputed in the
+    background every `refresh_interval` seconds, so readers never wait
+    on a refresh once the first snapshot exists.
+    """
+
+    def __init__(self, refresh_interval=REFRESH_INTERVAL, model=None, cache=None,
+                 history_period=HISTORY_PERIOD):
+        self.refresh_interval = refresh_interval
+        self.history_period = history_period
+        self.cache = cache
+        self._model = model
+        self._model_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._snapshots = {}
+        self._inflight = {}
+        self._errors = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, ticker=NIFTY_TICKER, period="6mo"):
+        """
+        Return the current snapshot, computing it (once) if none exists yet
+        """
+        key = (ticker, period)
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            snapshot = self._compute(key).result()
+        else:
+            incr("snapshot_requests", result="hit")
+        return _reader_view(snapshot)
+
+    def refresh(self, ticker=NIFTY_TICKER, period="6mo"):
+        """
+        Recompute a snapshot now; joins an in-flight computation if any
+        """
+        return _reader_view(self._compute((ticker, period)).result())
+
+    def start(self):
+        """
+        Start the background refresh thread (idempotent)
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._refresh_loop, name="snapshot-refresh", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        """
+        One row per tracked snapshot: when it was computed, its age in
+        seconds and the last background refresh error since then, if any
+        """
+        now = pd.Timestamp.now(tz="UTC")
+        with self._lock:
+            items = sorted(self._snapshots.items())
+            errors = dict(self._errors)
+        return [
+            {
+                "ticker": ticker,
+                "period": period,
+                "computed_at": snapshot.computed_at,
+                "age_seconds": snapshot_age(snapshot, now).total_seconds(),
+                "last_error": errors.get((ticker, period)),
+            }
+            for (ticker, period), snapshot in items
+        ]
+
+    @property
+    def model(self):
+        with self._model_lock:
+            if self._model is None:
+                self._model = get_regime_model()
+            return self._model
+
+    def _compute(self, key):
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                incr("snapshot_requests", result="joined")
+                return future
+            future = Future()
+            self._inflight[key] = future
+
+        incr("snapshot_requests", result="computed")
+        try:
+            with span("snapshot_build"):
+                snapshot = self._build(*key)
+        except BaseException as exc:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(exc)
+            return future
+
+        with self._lock:
+            self._snapshots[key] = snapshot
+            self._errors.pop(key, None)
+            del self._inflight[key]
+        future.set_result(snapshot)
+        return future
+
+    def _build(self, ticker, period):
+        model = self.model
+        prices = load_price_data(ticker, period=period)
+        current_regime, features = compute_current_regime(prices, model=model, cache=self.cache)
+
+        history = load_price_data(ticker, period=self.history_period, refresh=False)
+        _, history_features = compute_current_regime(history, model=model, cache=self.cache)
+        outlook = regime_outlook(history_features["regime"].to_numpy(), model.k)
+
+        return RegimeSnapshot(ticker, period, current_regime, features, prices, outlook,
+                              model.version, regime_names(model.k), pd.Timestamp.now(tz="UTC"))
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            with self._lock:
+                keys = list(self._snapshots)
+            for key in keys:
+                # A failed refresh leaves the previous snapshot in place;
+                # status() shows how stale it is getting
+                error = self._compute(key).exception()
+                if error is not None:
+                    incr("snapshot_refresh_errors", ticker=key[0], period=key[1])
+                    logger.error("Background refresh of %s (%s) failed", *key, exc_info=error)
+                    with self._lock:
+                        self._errors[key] = f"{type(error).__name__}: {error}"
+                with self._lock:
+                    snapshot = self._snapshots.get(key)
+                if snapshot is not None:
+                    gauge("snapshot_age_seconds", snapshot_age(snapshot).total_seconds(),
+                          ticker=key[0], period=key[1])
+
+
+def snapshot_age(snapshot, now=None):
+    """
+    Time since the snapshot was computed
+    """
+    return (now or pd.Timestamp.now(tz="UTC")) - snapshot.computed_at
+
+
+def _reader_view(snapshot):
+    # Under copy-on-write, shallow copies share the stored data and a session
+    # that adds or edits columns still never changes what other sessions see.
+    # Without it (pandas < 3 by default) an in-place edit would, so copy deeply
+    deep = not _copy_on_write()
+    return snapshot._replace(features=snapshot.features.copy(deep=deep),
+                             prices=snapshot.prices.copy(deep=deep))
+
+
+def _copy_on_write():
+    # Always on from pandas 3, where reading the option is deprecated
+    return int(pd.__version__.split(".")[0]) >= 3 or pd.options.mode.copy_on_write is True
+
+
+_SERVICE = None
+_SERVICE_LOCK = threading.Lock()
+
+
+def get_snapshot_service():
+    """
+    The process-wide SnapshotService, started on first use
+    """
+    global _SERVICE
+    with _SERVICE_LOCK:
+        if _SERVICE is None:
+            _SERVICE = SnapshotService(cache=ResultCache()).start()
+        return _SERVICE
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def rsi_signal(rsi):
     if rsi < 30:
         return 1
@@ -22,3 +25,62 @@ def bb_signal(close, lower_band, upper_band):
     return 0
 
 
+# ---------- VECTORIZED SIGNALS ----------
+# Same thresholds and tie handling as the scalar functions above: strict
+# comparisons, ties and NaNs give 0. Inputs broadcast against each other
+# and the result is an int8 array.
+
+def rsi_signal_array(rsi, lower=30, upper=70):
+    rsi = np.asarray(rsi, dtype=np.float64)
+    return _signal(rsi < lower, rsi > upper)
+
+
+def ma_signal_array(fast_ma, slow_ma):
+    fast_ma = np.asarray(fast_ma, dtype=np.float64)
+    slow_ma = np.asarray(slow_ma, dtype=np.float64)
+    return _signal(fast_ma > slow_ma, fast_ma < slow_ma)
+
+
+def bb_signal_array(close, lower_band, upper_band):
+    close = np.asarray(close, dtype=np.float64)
+    return _signal(close < np.asarray(lower_band, dtype=np.float64),
+                   close > np.asarray(upper_band, dtype=np.float64))
+
+
+# ---------- BATCH SIGNALS ----------
+# Evaluate many tickers and/or parameter sets in one call. Indicator
+# inputs may be (T,) or (n_tickers, T); parameter sets are stacked on a
+# new leading axis, so the result has shape (n_params, *input.shape).
+
+def rsi_signal_batch(rsi, thresholds=((30, 70),)):
+    """
+    thresholds: sequence of (lower, upper) pairs
+    """
+    rsi = np.asarray(rsi, dtype=np.float64)
+    bounds = np.asarray(thresholds, dtype=np.float64).reshape(-1, 2)
+    expand = (slice(None),) + (None,) * rsi.ndim
+    return rsi_signal_array(rsi[None], bounds[:, 0][expand], bounds[:, 1][expand])
+
+
+def ma_signal_batch(fast_mas, slow_mas):
+    """
+    fast_mas, slow_mas: sequences of MA arrays, one pair per parameter set
+    """
+    return ma_signal_array(np.stack([np.asarray(m, dtype=np.float64) for m in fast_mas]),
+                           np.stack([np.asarray(m, dtype=np.float64) for m in slow_mas]))
+
+
+def bb_signal_batch(close, lower_bands, upper_bands):
+    """
+    lower_bands, upper_bands: sequences of band arrays, one pair per parameter set
+    """
+    close = np.asarray(close, dtype=np.float64)
+    return bb_signal_array(close[None],
+                           np.stack([np.asarray(b, dtype=np.float64) for b in lower_bands]),
+                           np.stack([np.asarray(b, dtype=np.float64) for b in upper_bands]))
+
+
+def _signal(long_mask, short_mask):
+    out = long_mask.astype(np.int8)
+    out -= short_mask
+    return out
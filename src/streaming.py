@@ -0,0 +1,231 @@
+"""
+Chunked streaming regime pipeline for long (intraday) bar histories.
+
+    python -m src.streaming --csv nifty_1m.csv --interval 1m --out features/nifty_1m
+    python -m src.streaming --ticker ^NSEI --interval 5m --period 59d --out nifty_5m.csv
+
+Bars are read CHUNK_ROWS at a time. The last few bars of each chunk are
+carried into the next so rolling windows continue across the boundary.
+Each chunk's features and regime labels are written out before the next
+chunk is read. Memory is bounded by the chunk size whatever the length of
+the history. With --ticker the stored bars are read in row ranges, but the
+refresh that first merges new bars into the store holds the stored history
+in memory once; --offline skips it. Without a saved model for the
+interval, one is fitted first on a fixed-size reservoir sample of the
+stream's feature rows.
+"""
+import argparse
+import os
+import sys
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from src.features import build_features, FEATURE_COLUMNS
+from src.regime_model import RegimeModel
+from src.price_store import OHLCV_COLUMNS
+from src.feature_store import FeatureStore
+from src.instrumentation import span, incr
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+CHUNK_ROWS = 250_000
+
+# Feature rows kept to fit a model when none is given
+SAMPLE_SIZE = 200_000
+
+StreamSummary = namedtuple("StreamSummary", ["rows", "chunks", "regime_counts", "last_timestamp", "last_regime"])
+
+
+def csv_chunks(path, chunk_rows=CHUNK_ROWS):
+    """
+    OHLCV chunks from a yfinance CSV export (flat or two-level header)
+    """
+    with open(path) as f:
+        f.readline()
+        two_level = f.readline().startswith("Ticker")
+
+    reader = pd.read_csv(path, header=[0, 1] if two_level else 0, index_col=0, chunksize=chunk_rows)
+    for chunk in reader:
+        if two_level:
+            chunk.columns = chunk.columns.get_level_values(0)
+        chunk.index = pd.to_datetime(chunk.index, errors="coerce")
+        chunk = chunk[chunk.index.notna()]
+        chunk = chunk[OHLCV_COLUMNS].apply(pd.to_numeric, errors="coerce").dropna()
+        chunk.index.name = "Date"
+        if len(chunk):
+            yield chunk
+
+
+def frame_chunks(df, chunk_rows=CHUNK_ROWS):
+    """
+    Row slices of an in-memory bar frame
+    """
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def stream_features(chunks, vol_window=20, trend_window=50, range_window=20):
+    """
+    build_features over a stream of bar chunks, one feature frame per chunk.
+
+    Enough trailing bars of each chunk are prepended to the next one for
+    every rolling window to be full on its first bar, so the concatenated
+    feature columns equal build_features on the whole history. Each frame
+    also carries the bar's Close.
+    """
+    carry = max(vol_window + 1, trend_window, range_window)
+    tail = None
+
+    for chunk in chunks:
+        if tail is not None:
+            # Drop bars that overlap what has already been processed
+            chunk = chunk[chunk.index > tail.index[-1]]
+            if not len(chunk):
+                continue
+            bars = pd.concat([tail, chunk])
+        else:
+            bars = chunk
+
+        features = build_features(bars, vol_window=vol_window, trend_window=trend_window,
+                                  range_window=range_window)
+        features = features[features.index >= chunk.index[0]]
+        features["Close"] = chunk["Close"].reindex(features.index)
+
+        tail = bars.iloc[-carry:]
+        if len(features):
+            yield features
+
+
+def sample_features(chunks, size=SAMPLE_SIZE, seed=0, **windows):
+    """
+    Uniform reservoir sample of up to `size` feature rows from a stream
+    """
+    rng = np.random.default_rng(seed)
+    sample = np.empty((size, len(FEATURE_COLUMNS)))
+    seen = 0
+
+    for features in stream_features(chunks, **windows):
+        rows = features[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+
+        fill = min(max(size - seen, 0), len(rows))
+        sample[seen:seen + fill] = rows[:fill]
+
+        # Algorithm R: row number i (0-based) replaces a random slot with probability size / (i + 1)
+        rest = rows[fill:]
+        if len(rest):
+            slots = rng.integers(0, np.arange(seen + fill, seen + len(rows)) + 1)
+            keep = slots < size
+            sample[slots[keep]] = rest[keep]
+        seen += len(rows)
+
+    return pd.DataFrame(sample[:min(seen, size)], columns=FEATURE_COLUMNS)
+
+
+def fit_streaming_model(chunks, k=3, size=SAMPLE_SIZE, seed=0, **windows):
+    """
+    RegimeModel fitted on a reservoir sample of the stream
+    """
+    sample = sample_features(chunks, size=size, seed=seed, **windows)
+    if len(sample) < k:
+        raise ValueError(f"Need at least k={k} feature rows to fit a model, got {len(sample)}")
+    return RegimeModel(k=k).fit(sample)
+
+
+def stream_regimes(chunks, model, out=None, **windows):
+    """
+    Label every bar of a chunk stream and write the rows out chunk by chunk.
+
+    `out` is a .csv path or a FeatureStore directory, both in the
+    market_features_with_regime layout; the first chunk replaces anything
+    already there. None only collects the summary.
+    """
+    rows = n_chunks = 0
+    counts = np.zeros(model.k, dtype=np.int64)
+    last_ts = last_regime = None
+
+    for features in stream_features(chunks, **windows):
+        with span("stream_chunk"):
+            regimes = model.predict(features[FEATURE_COLUMNS])
+            features.insert(len(FEATURE_COLUMNS), "regime", regimes)
+            if out is not None:
+                _write(out, features, first=not n_chunks, attrs={"model": model.version})
+
+        rows += len(features)
+        n_chunks += 1
+        counts += np.bincount(regimes, minlength=model.k)
+        last_ts, last_regime = features.index[-1], int(regimes[-1])
+        incr("stream_rows", len(features))
+
+    return StreamSummary(rows, n_chunks, counts, last_ts, last_regime)
+
+
+def _write(out, features, first, attrs):
+    if out.endswith(".csv"):
+        features.to_csv(out, mode="w" if first else "a", header=first)
+    elif first:
+        FeatureStore(out).write(features, attrs=attrs)
+    else:
+        FeatureStore(out).append(features)
+
+
+def store_chunks(ticker, interval="1m", period="max", chunk_rows=CHUNK_ROWS, refresh=True, store=None):
+    """
+    OHLCV chunks of a ticker's bars in the price store, read in row
+    ranges so memory is bounded by the chunk size.
+
+    With refresh, new bars are first merged into the store through
+    load_price_data; that merge holds the stored history in memory once
+    (the store file is rewritten whole), so use refresh=False for strictly
+    bounded memory.
+    """
+    from src.data_loader import load_price_data, period_start
+    from src.price_store import PriceStore
+
+    store = store or PriceStore()
+    if refresh or not store.exists(ticker, interval):
+        load_price_data(ticker, period=period, interval=interval, store=store, refresh=refresh)
+
+    start = period_start(pd.Timestamp.now(tz="UTC"), period)
+    return store.read_chunks(ticker, interval, chunk_rows, start=start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv", help="bar CSV to stream")
+    source.add_argument("--ticker", help="ticker to load through the price store")
+    parser.add_argument("--interval", default="1m")
+    parser.add_argument("--period", default="max", help="history to load with --ticker")
+    parser.add_argument("--offline", action="store_true",
+                        help="use stored prices only (bounded memory; a refresh merges the history in memory once)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--model", help="saved RegimeModel; fitted on a sample and saved here if missing "
+                                        "(default models/regime_model_<interval>.npz)")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE)
+    parser.add_argument("--out", required=True, help=".csv file or FeatureStore directory")
+    args = parser.parse_args(argv)
+
+    if args.csv:
+        def chunks():
+            return csv_chunks(args.csv, args.chunk_rows)
+    else:
+        def chunks():
+            return store_chunks(args.ticker, args.interval, args.period, args.chunk_rows, refresh=not args.offline)
+
+    model_path = args.model or os.path.join(ROOT_DIR, "models", f"regime_model_{args.interval}.npz")
+    if os.path.exists(model_path):
+        model = RegimeModel.load(model_path)
+    else:
+        model = fit_streaming_model(chunks(), k=args.k, size=args.sample_size)
+        os.makedirs(os.path.dirname(os.path.abspath(model_path)), exist_ok=True)
+        model.save(model_path)
+
+    summary = stream_regimes(chunks(), model, out=args.out)
+    print(f"{summary.rows:,d} bars in {summary.chunks} chunks -> {args.out}; "
+          f"regime counts {summary.regime_counts.tolist()}, last {summary.last_regime} at {summary.last_timestamp}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
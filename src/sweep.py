@@ -0,0 +1,177 @@
+import itertools
+import os
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from src.features import build_features, FEATURE_COLUMNS
+from src.regime_model import RegimeModel
+from src.indicators import compute_rsi, moving_average, bollinger_bands
+from src.strategies import rsi_signal_array, ma_signal_array, bb_signal_array
+from src.decision_engine import adaptive_signal_array
+from src.backtest import run_backtest
+from src.result_cache import cached_backtest
+
+DEFAULT_GRID = {
+    "vol_window": [20],
+    "trend_window": [50],
+    "range_window": [20],
+    "k": [3],
+    "rsi_window": [14],
+    "rsi_lower": [30],
+    "rsi_upper": [70],
+    "ma_fast": [20],
+    "ma_slow": [50],
+    "bb_window": [20],
+    "bb_std": [2],
+}
+
+FEATURE_PARAMS = ["vol_window", "trend_window", "range_window"]
+
+# Arrays attached in each worker process: {key: (SharedMemory or None, ndarray)}
+_SHARED = {}
+
+# ResultCache for the backtests, set in each worker process by _attach
+_CACHE = None
+
+
+def parameter_grid(grid=None):
+    """
+    Expand {param: [values]} (merged over DEFAULT_GRID) into a list of dicts
+    """
+    grid = {**DEFAULT_GRID, **(grid or {})}
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def run_sweep(price_df, grid=None, n_workers=None, out_path=None, chunksize=1, cache=None):
+    """
+    Run the regime pipeline and strategy backtests over a parameter grid.
+
+    Prices and every distinct feature matrix are placed once in shared
+    memory; workers attach to them instead of receiving pickled copies.
+    Regime labels depend only on (feature set, k), so a first stage fits
+    each of those once and shares the labels; the strategy tasks only
+    read them. Results stream in as tasks finish and are appended to
+    `out_path` (CSV) when given. With a ResultCache, backtests already
+    run on the same prices, labels and signals are read back instead.
+    Returns one row per (params, strategy, regime).
+    """
+    tasks = parameter_grid(grid)
+    feature_keys = sorted({tuple(t[p] for p in FEATURE_PARAMS) for t in tasks})
+    for task in tasks:
+        task["feature_set"] = feature_keys.index(tuple(task[p] for p in FEATURE_PARAMS))
+    label_keys = sorted({(t["feature_set"], t["k"]) for t in tasks})
+    for task in tasks:
+        task["label_set"] = label_keys.index((task["feature_set"], task["k"]))
+
+    prices = price_df[["High", "Low", "Close"]].to_numpy(dtype=np.float64)
+    features = np.stack([_feature_matrix(price_df, dict(zip(FEATURE_PARAMS, key))) for key in feature_keys])
+
+    n_workers = n_workers or os.cpu_count() or 1
+    if out_path and os.path.exists(out_path):
+        os.remove(out_path)
+
+    results = []
+    if n_workers == 1:
+        _attach({}, cache)
+        _SHARED.update({"prices": (None, prices), "features": (None, features)})
+        try:
+            _SHARED["labels"] = (None, np.stack(list(map(_fit_labels, label_keys))))
+            for rows in map(_run_task, tasks):
+                _collect(results, rows, out_path)
+        finally:
+            _SHARED.clear()
+            _attach({}, None)
+        return pd.concat(results, ignore_index=True)
+
+    blocks = {key: _to_shared(arr) for key, arr in (("prices", prices), ("features", features))}
+    try:
+        with mp.Pool(min(n_workers, len(label_keys)), initializer=_attach,
+                     initargs=(_specs(blocks, ["features"]),)) as pool:
+            blocks["labels"] = _to_shared(np.stack(pool.map(_fit_labels, label_keys)))
+
+        with mp.Pool(n_workers, initializer=_attach,
+                     initargs=(_specs(blocks, ["prices", "labels"]), cache)) as pool:
+            for rows in pool.imap_unordered(_run_task, tasks, chunksize=chunksize):
+                _collect(results, rows, out_path)
+    finally:
+        for shm, _ in blocks.values():
+            shm.close()
+            shm.unlink()
+
+    return pd.concat(results, ignore_index=True)
+
+
+def _feature_matrix(price_df, windows):
+    # Full-length (T, d) matrix, NaN on warm-up rows, so every feature set
+    # shares the price row index
+    features = build_features(price_df, **windows).reindex(price_df.index)
+    return features[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+
+
+def _to_shared(arr):
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    view = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
+    view[...] = arr
+    return shm, view
+
+
+def _specs(blocks, keys):
+    return {key: (blocks[key][0].name, blocks[key][1].shape, blocks[key][1].dtype.str) for key in keys}
+
+
+def _attach(specs, cache=None):
+    global _CACHE
+    _CACHE = cache
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _SHARED[key] = (shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf))
+
+
+def _fit_labels(key):
+    # Regime label per price row for one (feature set, k); -1 on warm-up rows
+    feature_set, k = key
+    features = _SHARED["features"][1][feature_set]
+    valid = ~np.isnan(features).any(axis=1)
+    rows = pd.DataFrame(features[valid], columns=FEATURE_COLUMNS)
+
+    labels = np.full(len(features), -1, dtype=np.int64)
+    labels[valid] = RegimeModel(k=k).fit(rows).predict(rows)
+    return labels
+
+
+def _run_task(params):
+    prices = _SHARED["prices"][1]
+    labels = _SHARED["labels"][1][params["label_set"]]
+    valid = labels >= 0
+    regimes = labels[valid]
+
+    close = pd.Series(prices[:, 2])
+    rsi = compute_rsi(close, params["rsi_window"])
+    fast = moving_average(close, params["ma_fast"])
+    slow = moving_average(close, params["ma_slow"])
+    lower, upper = bollinger_bands(close, params["bb_window"], params["bb_std"])
+
+    signals = {
+        "rsi_signal": rsi_signal_array(rsi, params["rsi_lower"], params["rsi_upper"])[valid],
+        "ma_signal": ma_signal_array(fast, slow)[valid],
+        "bb_signal": bb_signal_array(close, lower, upper)[valid],
+    }
+    policies = {"adaptive": adaptive_signal_array}
+    if _CACHE is not None:
+        table = cached_backtest(close.to_numpy()[valid], regimes, signals, _CACHE, policies=policies)
+    else:
+        table = run_backtest(close.to_numpy()[valid], regimes, signals, policies=policies)
+
+    table = table.reset_index()
+    for key, value in params.items():
+        if key not in ("feature_set", "label_set"):
+            table[key] = value
+    return table
+
+
+def _collect(results, rows, out_path):
+    results.append(rows)
+    if out_path:
+        rows.to_csv(out_path, mode="a", header=len(results) == 1, index=False)
@@ -0,0 +1,104 @@
+from collections import namedtuple
+import numpy as np
+
+RegimeOutlook = namedtuple(
+    "RegimeOutlook",
+    ["regime", "elapsed", "continue_prob", "next_state_probs", "duration_quartiles",
+     "expected_remaining", "transition_matrix"],
+)
+
+
+def run_lengths(labels):
+    """
+    Run-length encode a label series: (values, lengths, starts)
+    """
+    labels = np.asarray(labels)
+    if not len(labels):
+        empty = np.array([], dtype=np.int64)
+        return labels[:0], empty, empty
+
+    starts = np.concatenate([[0], np.flatnonzero(labels[1:] != labels[:-1]) + 1])
+    lengths = np.diff(np.append(starts, len(labels)))
+    return labels[starts], lengths, starts
+
+
+def transition_matrix(labels, k):
+    """
+    Empirical bar-to-bar transition probabilities, rows = current regime
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    counts = np.bincount(labels[:-1] * k + labels[1:], minlength=k * k).reshape(k, k)
+    return _normalize_rows(counts)
+
+
+def run_transition_matrix(labels, k):
+    """
+    Probability of the regime that follows once a run of each regime ends
+    """
+    values, _, _ = run_lengths(np.asarray(labels, dtype=np.int64))
+    counts = np.bincount(values[:-1] * k + values[1:], minlength=k * k).reshape(k, k)
+    return _normalize_rows(counts)
+
+
+def duration_quartiles(labels, k):
+    """
+    (k, 3) array of the 25th/50th/75th percentile run length per regime.
+    The final run is still in progress and is left out.
+    """
+    values, lengths, _ = run_lengths(np.asarray(labels, dtype=np.int64))
+    values, lengths = values[:-1], lengths[:-1]
+
+    out = np.full((k, 3), np.nan)
+    order = np.lexsort((lengths, values))
+    values, lengths = values[order], lengths[order]
+    bounds = np.searchsorted(values, np.arange(k + 1))
+    for r in range(k):
+        runs = lengths[bounds[r]:bounds[r + 1]]
+        if len(runs):
+            out[r] = np.percentile(runs, [25, 50, 75])
+    return out
+
+
+def regime_outlook(labels, k, horizon=5):
+    """
+    Where the current (last) run of `labels` is likely to go next.
+
+    continue_prob is the share of past runs of the same regime that,
+    having lasted at least as long as the current one, went on for at
+    least `horizon` more bars. The remaining probability is split over
+    the other regimes by the run-to-run transition matrix.
+    expected_remaining is the mean number of further bars over those same
+    past runs (0 for runs that ended right there). Both are NaN when no
+    past run lasted as long as the current one.
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    values, lengths, _ = run_lengths(labels)
+    regime, elapsed = int(values[-1]), int(lengths[-1])
+
+    past = lengths[:-1][values[:-1] == regime]
+    # Runs that reached the current length, including those that ended at it
+    survivors = past[past >= elapsed]
+    if len(survivors):
+        continue_prob = float((survivors >= elapsed + horizon).mean())
+        expected_remaining = float((survivors - elapsed).mean())
+    else:
+        # No past run of this regime lasted this long; nothing to go on
+        continue_prob = expected_remaining = np.nan
+
+    next_state = run_transition_matrix(labels, k)[regime] * (1 - continue_prob)
+
+    return RegimeOutlook(
+        regime,
+        elapsed,
+        continue_prob,
+        next_state,
+        duration_quartiles(labels, k)[regime],
+        expected_remaining,
+        transition_matrix(labels, k),
+    )
+
+
+def _normalize_rows(counts):
+    totals = counts.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(totals > 0, counts / totals, np.nan)
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from src.features import FEATURE_COLUMNS
+from src.regime_model import RegimeModel
+
+
+def stack_universe(price_frames):
+    """
+    Stack per-ticker OHLC frames into (N, T) arrays.
+
+    Each ticker's own bars are right-aligned (left-padded with NaN), so
+    rolling windows run over that ticker's bar sequence exactly like the
+    single-ticker build_features, and column -1 is every ticker's latest bar.
+    Returns (tickers, dates, arrays) with dates as datetime64 (N, T) and
+    arrays = {"High": ..., "Low": ..., "Close": ...}.
+    """
+    tickers = list(price_frames)
+    T = max(len(df) for df in price_frames.values())
+    N = len(tickers)
+
+    dates = np.full((N, T), np.datetime64("NaT"), dtype="datetime64[ns]")
+    arrays = {col: np.full((N, T), np.nan) for col in ("High", "Low", "Close")}
+
+    for i, ticker in enumerate(tickers):
+        df = price_frames[ticker]
+        n = len(df)
+        if not n:
+            continue
+        index = df.index.tz_localize(None) if getattr(df.index, "tz", None) is not None else df.index
+        dates[i, T - n:] = index.to_numpy(dtype="datetime64[ns]")
+        for col, arr in arrays.items():
+            arr[i, T - n:] = df[col].to_numpy(dtype=np.float64)
+
+    return tickers, dates, arrays
+
+
+def build_features_batch(high, low, close, relative_range=False):
+    """
+    build_features for N tickers at once on (N, T) arrays.
+    Returns an (N, T, 4) array in FEATURE_COLUMNS order, NaN where undefined.
+    With relative_range, range_20 averages (High - Low) / Close instead of
+    the absolute range, so every feature is independent of the price level.
+    """
+    N, T = close.shape
+    features = np.full((N, T, len(FEATURE_COLUMNS)), np.nan)
+
+    returns = np.full((N, T), np.nan)
+    returns[:, 1:] = close[:, 1:] / close[:, :-1] - 1
+    features[..., 0] = returns
+
+    _rolling(features[..., 1], returns, 20, lambda w: w.std(axis=-1, ddof=1))
+    _rolling(features[..., 2], close, 50, lambda w: w.mean(axis=-1))
+    features[..., 2] = close / features[..., 2] - 1
+    ranges = (high - low) / close if relative_range else high - low
+    _rolling(features[..., 3], ranges, 20, lambda w: w.mean(axis=-1))
+
+    return features
+
+
+def scan_universe(price_frames, model=None, k=3):
+    """
+    Current regime for every ticker in one batched pass.
+
+    With model=None a single RegimeModel is fitted on the pooled universe
+    features, with range_20 taken relative to Close so that tickers pool
+    by behaviour rather than price level. A given model is fed features
+    in the units it was fitted on (build_features, absolute range).
+
+    Returns (table, labels): a per-ticker DataFrame of the latest bar's
+    date, regime, confidence, margin and features, and the (N, T) label
+    array (-1 where a bar has no complete feature row).
+    """
+    tickers, dates, arrays = stack_universe(price_frames)
+    features = build_features_batch(arrays["High"], arrays["Low"], arrays["Close"],
+                                    relative_range=model is None)
+
+    valid = ~np.isnan(features).any(axis=-1)
+    rows = features[valid]
+
+    if model is None:
+        model = RegimeModel(k=k).fit(pd.DataFrame(rows, columns=FEATURE_COLUMNS))
+
+    assignment = model.assign(pd.DataFrame(rows, columns=FEATURE_COLUMNS))
+    labels = np.full(valid.shape, -1, dtype=np.int64)
+    labels[valid] = assignment.labels
+    confidence = np.full(valid.shape, np.nan)
+    confidence[valid] = assignment.membership.max(axis=1)
+    margin = np.full(valid.shape, np.nan)
+    margin[valid] = assignment.margin
+
+    last = features[:, -1, :]
+    table = pd.DataFrame(last, columns=FEATURE_COLUMNS, index=pd.Index(tickers, name="ticker"))
+    table.insert(0, "date", dates[:, -1])
+    table.insert(1, "regime", labels[:, -1])
+    table.insert(2, "confidence", confidence[:, -1])
+    table.insert(3, "margin", margin[:, -1])
+    table["n_bars"] = (~np.isnan(arrays["Close"])).sum(axis=1)
+
+    return table, labels
+
+
+def _rolling(out, values, window, reduce):
+    if values.shape[1] < window:
+        return
+    out[:, window - 1:] = reduce(sliding_window_view(values, window, axis=1))
@@ -1,30 +1,156 @@
-import matplotlib.pyplot as plt
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+import numpy as np
+from src.instrumentation import span, incr
+from src.explain import regime_archetype
 
-def plot_regime_band(feature_data):
-    fig, ax = plt.subplots(figsize=(10, 2))
+# By archetype (see explain.regime_archetype)
+REGIME_COLORS = {
+    0: "green",
+    1: "orange",
+    2: "red"
+}
 
-    regime_colors = {
-        0: "green",
-        1: "orange",
-        2: "red"
-    }
+# Labels outside 0..k-1, e.g. -1 for bars without a regime yet
+UNASSIGNED_COLOR = "lightgray"
 
-    dates = feature_data.index
-    regimes = feature_data["regime"].values
+# Rendered timeline PNGs keyed by a hash of (dates, regimes, resolution).
+# Bytes rather than Figures: sessions share this and figures are not thread-safe
+_FIGURE_CACHE = OrderedDict()
+_FIGURE_CACHE_LOCK = threading.Lock()
+FIGURE_CACHE_SIZE = 8
 
-    for i in range(len(dates) - 1):
-        ax.axvspan(
-            dates[i],
-            dates[i + 1],
-            color=regime_colors[regimes[i]],
-            alpha=0.6
-        )
+FIGSIZE = (10, 2)
 
+
+def regime_spans(dates, regimes, max_spans=None):
+    """
+    Run-length encode a regime series into contiguous spans.
+
+    dates are matplotlib date numbers. Each run covers its first bar up to
+    the first bar of the next run (the last run ends at the last date), the
+    same coverage as one span per consecutive pair of bars. With max_spans,
+    a timeline with more runs than that is resampled onto max_spans
+    equal-width time bins (about one per pixel) so it collapses to what
+    can be seen; one with fewer runs is drawn exactly, however many bars
+    it has. Returns (starts, ends, values).
+    """
+    dates = np.asarray(dates, dtype=np.float64)
+    regimes = np.asarray(regimes)
+
+    first, last = _runs(regimes)
+    if max_spans is not None and len(first) > max_spans:
+        edges = np.linspace(dates[0], dates[-1], max_spans + 1)
+        sampled = np.searchsorted(dates, edges[:-1], side="right") - 1
+        dates, regimes = edges, np.append(regimes[sampled], regimes[-1])
+        first, last = _runs(regimes)
+
+    return dates[first], dates[last], regimes[first]
+
+
+def plot_regime_band(feature_data, max_spans="auto", k=3):
+    """
+    Regime timeline drawn as one bar collection per regime, coloured by
+    what each label of a k-regime model stands for. Returns a new figure.
+
+    max_spans="auto" downsamples to the figure's pixel width; None keeps
+    every regime change.
+    """
+    # matplotlib is imported on first plot so importing src stays light
+    import matplotlib.pyplot as plt
+
+    dates, regimes, max_spans = _timeline(feature_data, max_spans)
+    with span("plot_regime_band"):
+        fig = plt.figure(figsize=FIGSIZE)
+        _draw_regime_band(fig, dates, regimes, max_spans, k)
+    return fig
+
+
+def regime_band_png(feature_data, max_spans="auto", k=3):
+    """
+    plot_regime_band rendered to PNG bytes, cached across callers and
+    threads by a hash of what is drawn
+    """
+    dates, regimes, max_spans = _timeline(feature_data, max_spans)
+    h = hashlib.sha1(np.ascontiguousarray(dates).tobytes())
+    h.update(np.ascontiguousarray(regimes).tobytes())
+    h.update(repr((max_spans, k)).encode())
+    key = h.hexdigest()
+
+    with _FIGURE_CACHE_LOCK:
+        if key in _FIGURE_CACHE:
+            _FIGURE_CACHE.move_to_end(key)
+            incr("figure_cache_requests", result="hit")
+            return _FIGURE_CACHE[key]
+    incr("figure_cache_requests", result="miss")
+
+    # A pyplot-free figure per render, so concurrent misses share no state
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    with span("plot_regime_band"):
+        fig = Figure(figsize=FIGSIZE)
+        FigureCanvasAgg(fig)
+        _draw_regime_band(fig, dates, regimes, max_spans, k)
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", bbox_inches="tight")
+    png = buf.getvalue()
+
+    with _FIGURE_CACHE_LOCK:
+        _FIGURE_CACHE[key] = png
+        while len(_FIGURE_CACHE) > FIGURE_CACHE_SIZE:
+            _FIGURE_CACHE.popitem(last=False)
+    return png
+
+
+def _timeline(feature_data, max_spans):
+    # Matplotlib date numbers and labels, and max_spans with "auto" resolved
+    import matplotlib
+    import matplotlib.dates as mdates
+
+    if max_spans == "auto":
+        max_spans = int(FIGSIZE[0] * matplotlib.rcParams["figure.dpi"])
+
+    index = feature_data.index
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    dates = mdates.date2num(index.to_numpy(dtype="datetime64[ns]"))
+    return dates, feature_data["regime"].to_numpy(), max_spans
+
+
+def _draw_regime_band(fig, dates, regimes, max_spans, k):
+    ax = fig.subplots()
+
+    if len(dates) > 1:
+        starts, ends, values = regime_spans(dates, regimes, max_spans)
+        for regime in np.unique(values):
+            mask = values == regime
+            ax.broken_barh(
+                list(zip(starts[mask], ends[mask] - starts[mask])),
+                (0, 1),
+                facecolors=_regime_color(int(regime), k),
+                alpha=0.6
+            )
+        ax.set_xlim(dates[0], dates[-1])
+
+    ax.set_ylim(0, 1)
+    ax.xaxis_date()
     ax.set_yticks([])
     ax.set_title("Market Regime Timeline (Behavioral States)")
     ax.set_xlabel("Date")
 
-    return fig
 
+def _regime_color(regime, k):
+    if not 0 <= regime < k:
+        return UNASSIGNED_COLOR
+    return REGIME_COLORS[regime_archetype(regime, k)]
 
 
+def _runs(regimes):
+    # First bar of each run, and the bar where it ends (the next run's first)
+    change = np.flatnonzero(regimes[1:] != regimes[:-1]) + 1
+    first = np.concatenate([[0], change])
+    last = np.concatenate([change, [len(regimes) - 1]])
+    return first, last
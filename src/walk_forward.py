@@ -0,0 +1,67 @@
+import itertools
+import numpy as np
+import pandas as pd
+from src.regime_model import RegimeModel
+
+
+def walk_forward_regimes(features, k=3, min_train=252, refit_every=21, window=None):
+    """
+    Lookahead-free regime labels.
+
+    Every `refit_every` bars a RegimeModel is refitted on the preceding rows
+    only (expanding, or the last `window` rows when given) and used to label
+    the next block of bars. Each refit is warm-started from the previous
+    centroids, and its labels are matched to the previous model's so that a
+    regime keeps its id across refits. The first `min_train` rows are -1.
+
+    Returns (labels, refits): a label Series aligned with `features` and a
+    DataFrame describing every refit.
+    """
+    T = len(features)
+    labels = np.full(T, -1, dtype=np.int64)
+    refits = []
+    model = None
+
+    for start in range(min_train, T, refit_every):
+        stop = min(start + refit_every, T)
+        train = features.iloc[0 if window is None else max(0, start - window):start]
+
+        if model is None:
+            model = RegimeModel(k=k).fit(train)
+        else:
+            previous = model.centroids
+            model = RegimeModel(k=k, n_init=1).fit(train, init=previous)
+            model.relabel(_match_centroids(model.transform(previous), model.centroids_))
+
+        labels[start:stop] = model.predict(features.iloc[start:stop])
+        refits.append({
+            "date": features.index[start],
+            "n_train": len(train),
+            "n_iter": model.n_iter_,
+            "inertia": model.inertia_,
+        })
+
+    return pd.Series(labels, index=features.index, name="regime"), pd.DataFrame(refits)
+
+
+def _match_centroids(reference, centroids):
+    """
+    order such that centroids[order[i]] is the centroid closest to reference[i]
+    """
+    k = len(reference)
+    cost = ((reference[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=-1)
+
+    if k <= 8:
+        rows = np.arange(k)
+        best = min(itertools.permutations(range(k)), key=lambda p: cost[rows, list(p)].sum())
+        return np.array(best)
+
+    # Greedy matching on the cheapest remaining pair for larger k
+    order = np.full(k, -1)
+    free = np.ones(k, dtype=bool)
+    for flat in np.argsort(cost, axis=None):
+        i, j = divmod(int(flat), k)
+        if order[i] < 0 and free[j]:
+            order[i] = j
+            free[j] = False
+    return order